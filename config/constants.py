@@ -1,7 +1,30 @@
 import os
 
 # config/constants.py (добавь)
-BINANCE_TICKER_URL = "https://api.binance.com/api/v3/ticker/24hr"
+# Базовые адреса REST и WebSocket API (переопределяются, например, на локальный stubs/binance_stub.py)
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com")
+BINANCE_FAPI_URL = os.getenv("BINANCE_FAPI_URL", "https://fapi.binance.com")
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+
+BINANCE_TICKER_URL = f"{BINANCE_API_URL}/api/v3/ticker/24hr"
+BINANCE_KLINES_URL = f"{BINANCE_API_URL}/api/v3/klines"
+KLINES_PAGE_LIMIT = 1000  # максимум свечей в одном ответе /klines
+KLINE_STREAMS_PER_CONNECTION = 200  # потоков в одном combined-соединении (лимит Binance — 1024)
+
+# Бюджет веса запросов в минуту на IP: spot и futures считаются раздельно.
+# BINANCE_WEIGHT_SAFETY — доля лимита, которую планировщик позволяет себе занять.
+BINANCE_WEIGHT_LIMITS = {
+    "api": int(os.getenv("BINANCE_SPOT_WEIGHT_LIMIT", 6000)),
+    "fapi": int(os.getenv("BINANCE_FAPI_WEIGHT_LIMIT", 2400)),
+}
+BINANCE_WEIGHT_SAFETY = float(os.getenv("BINANCE_WEIGHT_SAFETY", 0.8))
+BINANCE_MAX_IN_FLIGHT = int(os.getenv("BINANCE_MAX_IN_FLIGHT", 20))
+
+# Общий HTTP-клиент (services/http_client.py)
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))              # соединений всего
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 30))
+HTTP_DNS_TTL = 300        # сек кэша DNS
+HTTP_KEEPALIVE = 60       # сек жизни простаивающего соединения
 
 DB_CONFIG = {
     "dbname": os.getenv("DB_NAME", "postgres"),
@@ -11,9 +34,41 @@ DB_CONFIG = {
     "port": os.getenv("DB_PORT", "5432"),
 }
 
+# Пул соединений создаётся лениво; размеры и ожидание свободного соединения
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Анализ рядов в run_full (services/analysis_pool.py): "process" — шарды
+# (symbol, timeframe) по пулу процессов, "serial" — в текущем процессе
+ANALYZE_BACKEND = os.getenv("ANALYZE_BACKEND", "process")
+ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", os.cpu_count() or 1))
+
+# retention — окно хранения в секундах; свеча удаляется, только если она
+# старше окна и не входит в последние limit свечей ряда
 CANDLE_SETTINGS = {
-    "1d": {"interval": "1d", "limit": 900, "update_freq": 86400},
-    "4h": {"interval": "4h", "limit": 800, "update_freq": 14400},
-    "1h": {"interval": "1h", "limit": 700, "update_freq": 3600},
-    "15m": {"interval": "15m", "limit": 500, "update_freq": 900},
+    "1d": {"interval": "1d", "limit": 900, "update_freq": 86400, "retention": 90 * 86400},
+    "4h": {"interval": "4h", "limit": 800, "update_freq": 14400, "retention": 30 * 86400},
+    "1h": {"interval": "1h", "limit": 700, "update_freq": 3600, "retention": 30 * 86400},
+    "15m": {"interval": "15m", "limit": 500, "update_freq": 900, "retention": 14 * 86400},
+}
+
+# Базовый таймфрейм: по REST качается только он, старшие собираются из него
+# (services/resampler.py); полная история старших — при первой загрузке и backfill
+BASE_TIMEFRAME = "15m"
+
+# Длительность свечи таймфрейма в миллисекундах
+TIMEFRAME_MS = {
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "1h": 60 * 60_000,
+    "4h": 4 * 60 * 60_000,
+    "1d": 24 * 60 * 60_000,
+}
+
+# Сколько дней хранить дневные секции (database/partitions.py)
+PARTITION_RETENTION_DAYS = {
+    "signals": 2,
+    "alerts": 7,
+    "market_cap": 30,
 }
@@ -1,17 +1,20 @@
 import os
 import logging
-import psycopg2
-from psycopg2 import pool
 from datetime import datetime, timedelta
 from psycopg2.extras import execute_values
 import json
+from io import StringIO
 import numpy as np
 from datetime import datetime
 import time
-import re
 MAX_CONN = 50
 
-from config.constants import DB_CONFIG  # теперь так
+from config.constants import (  # теперь так
+    DB_CONFIG, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, CANDLE_SETTINGS, PARTITION_RETENTION_DAYS, TIMEFRAME_MS,
+)
+from database.pool import InstrumentedPool, caller_site
+from database.schema import INDICATOR_COLUMNS, apply_migrations
+from database import partitions
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -39,301 +42,203 @@ class DatabaseManager:
             'port': os.getenv('DB_PORT', '5432')
         }
 
-        self.connection_pool = psycopg2.pool.ThreadedConnectionPool(
-            minconn=10,
-            maxconn=30,
+        # Соединения открываются при первом запросе, а не при импорте
+        self.connection_pool = InstrumentedPool(
+            minconn=DB_POOL_MIN,
+            maxconn=DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
             **self.db_config
         )
 
-        logger.debug("✅ Успешное подключение к БД")
-
     @classmethod
     def init_schema_once(cls):
+        """Применяет недостающие миграции схемы (см. database/schema.py)."""
         instance = cls()
-        instance._create_tables()
-        instance._create_indexes()
-        logger.info("✅ База инициализирована один раз")
+        conn = instance.get_connection()
+        try:
+            apply_migrations(conn)
+        finally:
+            instance.release_connection(conn)
         return instance
-        # Теперь можно безопасно создавать таблицы
-        self._create_tables()
-        self._create_indexes()
-        logger.info("Таблицы созданы/проверены")
 
     def get_connection(self):
-        return self.connection_pool.getconn()
+        return self.connection_pool.getconn(site=caller_site())
 
     def release_connection(self, conn):
         self.connection_pool.putconn(conn)
 
-    def _create_tables(self):
-        """Создание и изменение структуры таблиц, очистка содержимого в конце"""
-        # --- Шаг 1: Создание и изменение структуры таблиц ---
-        start_time = time.time()
-        ddl_queries = [
-            # Таблица collected_candles
-            """
-            CREATE TABLE IF NOT EXISTS collected_candles (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20) NOT NULL,
-                timeframe VARCHAR(5) NOT NULL,
-                candles JSONB NOT NULL,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE (symbol, timeframe)
-            );
-            """,
-
-            # Таблица levels
-            """
-            CREATE TABLE IF NOT EXISTS levels (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20) NOT NULL,
-                timeframe VARCHAR(5) NOT NULL,
-                price DECIMAL(20,8) NOT NULL,
-                type VARCHAR(10) NOT NULL,
-                strength INT NOT NULL,
-                upper DECIMAL(20,8),
-                lower DECIMAL(20,8),
-                distance DECIMAL(10,4),
-                touched INT DEFAULT 0,
-                broken BOOLEAN DEFAULT FALSE,
-                last_touched TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-
-            # Таблица alerts
-            """
-            CREATE TABLE IF NOT EXISTS alerts (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20),
-                level_price DECIMAL(20,8),
-                current_price DECIMAL(20,8),
-                type VARCHAR(20),
-                distance DECIMAL(10,4),
-                strength INT,
-                timeframe VARCHAR(10),
-                source VARCHAR(20),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            """
-            ALTER TABLE alerts
-            ADD COLUMN IF NOT EXISTS source VARCHAR(20);
-            """,
-
-            # Таблица pairs_cache
-            """
-            CREATE TABLE IF NOT EXISTS pairs_cache (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20) NOT NULL,
-                volume DECIMAL(20,8) NOT NULL,
-                first_seen TIMESTAMP,
-                last_seen TIMESTAMP,
-                missing_periods INT DEFAULT 0
-            );
-            """,
-
-            # Таблица trend_cache
-            """
-            CREATE TABLE IF NOT EXISTS trend_cache (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20) NOT NULL UNIQUE,
-                direction VARCHAR(10) NOT NULL,
-                ema50 DECIMAL(20,8),
-                ema200 DECIMAL(20,8),
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-
-            # Таблица indicators
-            """
-            CREATE TABLE IF NOT EXISTS indicators (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20) NOT NULL,
-                timeframe VARCHAR(5) NOT NULL,
-                indicator_type VARCHAR(20) NOT NULL,
-                value DECIMAL(20,8),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            """
-            ALTER TABLE IF EXISTS indicators
-            ALTER COLUMN value TYPE VARCHAR(50)
-            USING value::VARCHAR(50);
-            """,
-            # В метод _create_tables, в список ddl_queries добавьте:
-            """
-            CREATE TABLE IF NOT EXISTS market_cap (
-                id SERIAL PRIMARY KEY,
-                total_cap DECIMAL(20,2) NOT NULL,
-                fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS open_orders (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20),
-                entry_price DECIMAL(20,8),
-                leverage INT,
-                open_time BIGINT,
-                target_price DECIMAL(20,8),
-                stop_loss DECIMAL(20,8),
-                order_id VARCHAR(50)
-            );
-            """,
-
-            # Таблица signals
-            """
-            CREATE TABLE IF NOT EXISTS signals (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20) NOT NULL,
-                timeframe VARCHAR(5) NOT NULL,
-                signal_type VARCHAR(255) NOT NULL,
-                price DECIMAL(20,8) NOT NULL,
-                time BIGINT NOT NULL,
-                indicator VARCHAR(50),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            """
-            ALTER TABLE signals
-            ADD COLUMN IF NOT EXISTS score INT,
-            ADD COLUMN IF NOT EXISTS details TEXT,
-            ADD COLUMN IF NOT EXISTS recommendation VARCHAR(50),
-            ADD COLUMN IF NOT EXISTS current_price DECIMAL(20,8),
-            ADD COLUMN IF NOT EXISTS rsi DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS macd DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS ema50 DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS ema200 DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS bb_position DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS stoch_k DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS stoch_d DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS atr DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS adx DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS vwap DOUBLE PRECISION,
-            ADD COLUMN IF NOT EXISTS poc DOUBLE PRECISION;
-
-            """,
-        ]
+    def pool_stats(self):
+        """Счётчики пула: выдачи, ожидание, пик занятых, удержание по местам вызова"""
+        return self.connection_pool.stats()
 
-        conn = self.get_connection()
-        try:
-            with conn.cursor() as cur:
-                for i, query in enumerate(ddl_queries):
-                    table_name = self._extract_table_name(query)
-                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    logger.info(f"[{timestamp}] ⏳ Создание таблицы: {table_name}")
-                    cur.execute(query)
-            conn.commit()
-            duration = round(time.time() - start_time, 2)
+    def log_pool_stats(self):
+        stats = self.pool_stats()
+        if not stats["checkouts"]:
+            return
+        logger.info(
+            f"📊 Пул БД: выдач {stats['checkouts']}, пик занятых {stats['in_use_peak']}/{stats['maxconn']}, "
+            f"ожидание всего {stats['wait_total_sec']} сек (макс {stats['wait_max_sec']} сек), "
+            f"гистограмма {stats['wait_histogram']}"
+        )
+        slowest = sorted(stats["hold_by_site"].items(), key=lambda kv: kv[1]["total_sec"], reverse=True)[:5]
+        for site, hold in slowest:
             logger.info(
-                f"[{datetime.now().strftime('%H:%M:%S')}] ✅ Всего создано {len(ddl_queries)} таблиц за {duration} сек.")
-        except Exception as e:
-            logger.error(f"❌ Ошибка при создании таблиц: {e}", exc_info=True)
-            conn.rollback()
-        finally:
-            self.release_connection(conn)
+                f"📊   {site}: {hold['count']} раз, всего {hold['total_sec']} сек, "
+                f"в среднем {hold['avg_ms']} мс, макс {hold['max_ms']} мс"
+            )
 
-    def _extract_table_name(self, query: str) -> str:
-        import re
-        match = re.search(r"(CREATE|ALTER)\s+TABLE(?: IF NOT EXISTS)?\s+(\w+)", query, re.IGNORECASE)
-        return match.group(2) if match else "неизвестно"
-
-    def _create_indexes(self):
-        """Создание индексов для оптимизации запросов"""
-        indexes = [
-            "CREATE INDEX IF NOT EXISTS idx_candles_symbol_timeframe ON collected_candles (symbol, timeframe);",
-            "CREATE INDEX IF NOT EXISTS idx_candles_last_updated ON collected_candles (last_updated);",
-            "CREATE INDEX IF NOT EXISTS idx_levels_symbol_timeframe ON levels (symbol, timeframe);",
-            "CREATE UNIQUE INDEX IF NOT EXISTS idx_signals_unique ON signals (symbol, timeframe, signal_type, time);"
-            "CREATE INDEX IF NOT EXISTS idx_levels_price ON levels (price);"
-            "CREATE INDEX IF NOT EXISTS idx_indicators_sym_tf ON indicators(symbol, timeframe);"
-        ]
-        conn = self.get_connection()
-        try:
-            with conn.cursor() as cur:
-                for idx in indexes:
-                    cur.execute(idx)
-            conn.commit()
-        except Exception as e:
-            logger.error(f"Ошибка создания индексов: {e}")
-            conn.rollback()
-        finally:
-            self.release_connection(conn)
+    # Обновление метаданных ряда: последняя свеча меняется, только если
+    # пришедшая не старше уже записанной
+    _SERIES_UPSERT = """
+        ON CONFLICT (symbol, timeframe) DO UPDATE
+        SET last_updated = EXCLUDED.last_updated,
+            last_open_time = GREATEST(candle_series.last_open_time, EXCLUDED.last_open_time),
+            last_close = CASE
+                WHEN candle_series.last_open_time IS NULL
+                  OR EXCLUDED.last_open_time >= candle_series.last_open_time
+                THEN EXCLUDED.last_close
+                ELSE candle_series.last_close
+            END
+    """
 
     def upsert_candles(self, symbol, timeframe, new_candles):
-        logger.debug(f"🔄 Обновление свечей {symbol} {timeframe}")
+        """Свечи одного ряда через bulk_upsert_candles. Возвращает количество записанных свечей."""
+        merged = self.bulk_upsert_candles([(symbol, timeframe, new_candles)])
+        return sum(counts["new"] + counts["updated"] for counts in merged.values())
+
+    def bulk_upsert_candles(self, results):
+        """Массовая загрузка свечей через COPY во временную таблицу.
+
+        results — итерируемое из (symbol, timeframe, candles). Все свечи
+        одной транзакцией попадают в staging-таблицу, сливаются в candles
+        одним INSERT ... ON CONFLICT, после чего ряды обрезаются до лимитов
+        CANDLE_SETTINGS. Возвращает {(symbol, timeframe): {"new": n, "updated": m}}.
+        """
+        timeframes = list(CANDLE_SETTINGS)
+        limits = [cfg["limit"] for cfg in CANDLE_SETTINGS.values()]
+        start = time.time()
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
+            # Буфер собирается внутри try: битая свеча логируется как ошибка загрузки
+            buffer = StringIO()
+            staged = 0
+            for symbol, timeframe, candles in results:
+                for c in candles or ():
+                    buffer.write(
+                        f"{symbol}\t{timeframe}\t{int(c['time'])}\t{float(c['open'])!r}\t{float(c['high'])!r}\t"
+                        f"{float(c['low'])!r}\t{float(c['close'])!r}\t{float(c['volume'])!r}\n"
+                    )
+                    staged += 1
+            if not staged:
+                return {}
+            buffer.seek(0)
+
             with conn.cursor() as cur:
-                # Получаем текущие свечи
                 cur.execute("""
-                            SELECT candles
-                            FROM collected_candles
-                            WHERE symbol = %s
-                              AND timeframe = %s
-                            """, (symbol, timeframe))
-                result = cur.fetchone()
-                # Убираем json.loads, так как данные уже десериализованы
-                current_candles = result[0] if result else []
-                # Фильтрация новых свечей
-                existing_times = {candle['time'] for candle in current_candles}
-                filtered_new = [
-                    candle for candle in new_candles
-                    if candle['time'] not in existing_times
-                ]
-                if not filtered_new:
-                    logger.debug("Нет новых свечей для добавления")
-                    return len(current_candles)
-                # Объединение и сортировка
-                merged = current_candles + filtered_new
-                merged.sort(key=lambda x: x['time'])
-                # Ограничение количества
-                max_candles = {
-                    '1d': 900,
-                    '4h': 800,
-                    '1h': 700,
-                    '15m': 500
-                }.get(timeframe, 500)
-                if len(merged) > max_candles:
-                    merged = merged[-max_candles:]
-                # Обновление или вставка
-                if result:
-                    cur.execute("""
-                                UPDATE collected_candles
-                                SET candles      = %s,
-                                    last_updated = CURRENT_TIMESTAMP
-                                WHERE symbol = %s
-                                  AND timeframe = %s
-                                """, (json.dumps(merged), symbol, timeframe))
-                else:
-                    cur.execute("""
-                                INSERT INTO collected_candles (symbol, timeframe, candles)
-                                VALUES (%s, %s, %s)
-                                """, (symbol, timeframe, json.dumps(merged)))
-                conn.commit()
-                return len(merged)
+                    CREATE TEMP TABLE candles_stage
+                    (LIKE candles INCLUDING DEFAULTS)
+                    ON COMMIT DROP
+                """)
+                cur.copy_expert("""
+                    COPY candles_stage (symbol, timeframe, open_time, open, high, low, close, volume)
+                    FROM STDIN
+                """, buffer)
+
+                # xmax = 0 — строка вставлена, иначе обновлена существующая
+                cur.execute("""
+                    WITH merged AS (
+                        INSERT INTO candles (symbol, timeframe, open_time, open, high, low, close, volume)
+                        SELECT DISTINCT ON (symbol, timeframe, open_time)
+                               symbol, timeframe, open_time, open, high, low, close, volume
+                        FROM candles_stage
+                        ORDER BY symbol, timeframe, open_time
+                        ON CONFLICT (symbol, timeframe, open_time) DO UPDATE
+                        SET open   = EXCLUDED.open,
+                            high   = EXCLUDED.high,
+                            low    = EXCLUDED.low,
+                            close  = EXCLUDED.close,
+                            volume = EXCLUDED.volume
+                        RETURNING symbol, timeframe, (xmax = 0) AS inserted
+                    )
+                    SELECT symbol, timeframe,
+                           COUNT(*) FILTER (WHERE inserted),
+                           COUNT(*) FILTER (WHERE NOT inserted)
+                    FROM merged
+                    GROUP BY symbol, timeframe
+                """)
+                merged = {(row[0], row[1]): {"new": row[2], "updated": row[3]} for row in cur.fetchall()}
+
+                # Обрезка затронутых рядов до лимита таймфрейма
+                cur.execute("""
+                    DELETE FROM candles c
+                    USING (
+                        SELECT r.symbol, r.timeframe, r.open_time
+                        FROM (
+                            SELECT symbol, timeframe, open_time,
+                                   row_number() OVER (
+                                       PARTITION BY symbol, timeframe ORDER BY open_time DESC
+                                   ) AS rn
+                            FROM candles
+                            WHERE (symbol, timeframe) IN (SELECT DISTINCT symbol, timeframe FROM candles_stage)
+                        ) r
+                        LEFT JOIN unnest(%s::text[], %s::int[]) AS lim(timeframe, max_candles)
+                               ON lim.timeframe = r.timeframe
+                        WHERE r.rn > COALESCE(lim.max_candles, 500)
+                    ) old
+                    WHERE c.symbol = old.symbol
+                      AND c.timeframe = old.timeframe
+                      AND c.open_time = old.open_time
+                """, (timeframes, limits))
+
+                cur.execute(f"""
+                    INSERT INTO candle_series (symbol, timeframe, last_updated, last_open_time, last_close)
+                    SELECT DISTINCT ON (symbol, timeframe)
+                           symbol, timeframe, CURRENT_TIMESTAMP, open_time, close
+                    FROM candles_stage
+                    ORDER BY symbol, timeframe, open_time DESC
+                    {self._SERIES_UPSERT}
+                """)
+            conn.commit()
+            for (symbol, timeframe), counts in merged.items():
+                logger.debug(f"🔄 {symbol} {timeframe}: новых {counts['new']}, обновлено {counts['updated']}")
+            new = sum(c["new"] for c in merged.values())
+            logger.info(
+                f"💾 COPY: {len(merged)} рядов, {staged} свечей (новых {new}, обновлено {staged - new}) "
+                f"за {time.time() - start:.2f} сек"
+            )
+            return merged
         except Exception as e:
-            logger.error(f"❌ Ошибка обновления свечей {symbol} {timeframe}: {e}", exc_info=True)
+            logger.error(f"❌ Ошибка массовой загрузки свечей: {e}", exc_info=True)
             conn.rollback()
-            return 0
+            return {}
         finally:
             self.release_connection(conn)
 
+    @staticmethod
+    def _candle_from_row(row):
+        """(open_time, open, high, low, close, volume) → словарь свечи"""
+        return {
+            "time": int(row[0]),
+            "open": row[1],
+            "high": row[2],
+            "low": row[3],
+            "close": row[4],
+            "volume": row[5],
+        }
+
     def get_candles(self, symbol, timeframe):
         """Получение свечей для конкретной пары и таймфрейма"""
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
                 cur.execute("""
-                            SELECT candles
-                            FROM collected_candles
+                            SELECT open_time, open, high, low, close, volume
+                            FROM candles
                             WHERE symbol = %s
                               AND timeframe = %s
+                            ORDER BY open_time
                             """, (symbol, timeframe))
-                result = cur.fetchone()
-                # Возвращаем список напрямую
-                return result[0] if result else []
+                return [self._candle_from_row(row) for row in cur.fetchall()]
         except Exception as e:
             logger.error(f"Ошибка получения свечей {symbol} {timeframe}: {e}")
             return []
@@ -347,63 +252,109 @@ class DatabaseManager:
             with conn.cursor() as cur:
                 if timeframe:
                     cur.execute("""
-                                SELECT symbol, timeframe, candles
-                                FROM collected_candles
+                                SELECT symbol, timeframe, open_time, open, high, low, close, volume
+                                FROM candles
                                 WHERE timeframe = %s
+                                ORDER BY symbol, timeframe, open_time
                                 """, (timeframe,))
                 else:
-                    cur.execute("SELECT symbol, timeframe, candles FROM collected_candles")
-                result = cur.fetchall()
-                # Убираем json.loads, так как данные уже десериализованы
-                return {(row[0], row[1]): row[2] for row in result}
+                    cur.execute("""
+                                SELECT symbol, timeframe, open_time, open, high, low, close, volume
+                                FROM candles
+                                ORDER BY symbol, timeframe, open_time
+                                """)
+                result = {}
+                for row in cur.fetchall():
+                    result.setdefault((row[0], row[1]), []).append(self._candle_from_row(row[2:]))
+                return result
         except Exception as e:
             logger.error(f"Ошибка получения всех свечей: {e}")
             return {}
         finally:
             self.release_connection(conn)
 
-    def clear_old_candles(self):
-        """Очистка устаревших свечей с защитой от NULL"""
+    def get_candles_since(self, timeframe, since_by_symbol):
+        """Свечи таймфрейма начиная с open_time, своего для каждой пары: {symbol: [candles]}"""
+        if not since_by_symbol:
+            return {}
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
-                # Очищаем 1d старше 3 месяцев
                 cur.execute("""
-                    UPDATE collected_candles
-                    SET candles = COALESCE((
-                        SELECT jsonb_agg(c)
-                        FROM jsonb_array_elements(candles) AS c
-                        WHERE (c ->> 'time')::BIGINT > EXTRACT(EPOCH FROM NOW() - INTERVAL '3 months') * 1000
-                    ), '[]'::jsonb)
-                    WHERE timeframe = '1d'
-                """)
+                    SELECT c.symbol, c.open_time, c.open, c.high, c.low, c.close, c.volume
+                    FROM candles c
+                    JOIN unnest(%s::text[], %s::bigint[]) AS s(symbol, since)
+                      ON c.symbol = s.symbol AND c.open_time >= s.since
+                    WHERE c.timeframe = %s
+                    ORDER BY c.symbol, c.open_time
+                """, (list(since_by_symbol), list(since_by_symbol.values()), timeframe))
+                result = {}
+                for row in cur.fetchall():
+                    result.setdefault(row[0], []).append(self._candle_from_row(row[1:]))
+                return result
+        except Exception as e:
+            logger.error(f"Ошибка получения свечей {timeframe}: {e}")
+            return {}
+        finally:
+            self.release_connection(conn)
 
-                # Очищаем 4h и 1h старше 1 месяца
-                cur.execute("""
-                    UPDATE collected_candles
-                    SET candles = COALESCE((
-                        SELECT jsonb_agg(c)
-                        FROM jsonb_array_elements(candles) AS c
-                        WHERE (c ->> 'time')::BIGINT > EXTRACT(EPOCH FROM NOW() - INTERVAL '1 month') * 1000
-                    ), '[]'::jsonb)
-                    WHERE timeframe IN ('4h', '1h')
-                """)
+    @staticmethod
+    def candle_retention_cutoff(timeframe, now_ms=None):
+        """open_time, раньше которого свечи таймфрейма считаются устаревшими.
 
-                # Очищаем 15m старше 2 недель
-                cur.execute("""
-                    UPDATE collected_candles
-                    SET candles = COALESCE((
-                        SELECT jsonb_agg(c)
-                        FROM jsonb_array_elements(candles) AS c
-                        WHERE (c ->> 'time')::BIGINT > EXTRACT(EPOCH FROM NOW() - INTERVAL '2 weeks') * 1000
-                    ), '[]'::jsonb)
-                    WHERE timeframe = '15m'
-                """)
+        Окно — большее из retention и глубины limit свечей, чтобы очистка
+        не срезала историю, которую держит CANDLE_SETTINGS.
+        """
+        cfg = CANDLE_SETTINGS[timeframe]
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        window_ms = max(cfg["retention"] * 1000, cfg["limit"] * TIMEFRAME_MS[timeframe])
+        return now_ms - window_ms
+
+    def clear_old_candles(self):
+        """Удаление устаревших свечей по политикам CANDLE_SETTINGS.
+
+        Удаление идёт диапазоном по индексу (timeframe, open_time), поэтому
+        читаются только истёкшие свечи. Возвращает {timeframe: удалено свечей}.
+        """
+        dropped = {}
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                for timeframe in CANDLE_SETTINGS:
+                    cur.execute("""
+                        WITH expired AS (
+                            DELETE FROM candles
+                            WHERE timeframe = %s
+                              AND open_time < %s
+                            RETURNING symbol
+                        )
+                        SELECT COUNT(*), COALESCE(array_agg(DISTINCT symbol), '{}') FROM expired
+                    """, (timeframe, self.candle_retention_cutoff(timeframe)))
+                    count, symbols = cur.fetchone()
+                    if not count:
+                        continue
+                    dropped[timeframe] = count
+
+                    # Ряды, у которых не осталось ни одной свечи
+                    cur.execute("""
+                        DELETE FROM candle_series s
+                        WHERE s.timeframe = %s
+                          AND s.symbol = ANY(%s)
+                          AND NOT EXISTS (
+                              SELECT 1 FROM candles c
+                              WHERE c.symbol = s.symbol AND c.timeframe = s.timeframe
+                          )
+                    """, (timeframe, symbols))
+                    logger.info(f"🧹 Свечи {timeframe}: удалено {count} из {len(symbols)} рядов")
 
             conn.commit()
+            if not dropped:
+                logger.info("🧹 Устаревших свечей нет")
+            return dropped
         except Exception as e:
             logger.error(f"Ошибка очистки старых свечей: {e}")
             conn.rollback()
+            return {}
         finally:
             self.release_connection(conn)
 
@@ -445,12 +396,15 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
 
-    def get_levels(self):
-        """Получение уровней из БД"""
+    def get_levels(self, symbol=None, timeframe=None):
+        """Получение уровней из БД (все или одного ряда)"""
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("SELECT * FROM levels")
+                if symbol is not None:
+                    cur.execute("SELECT * FROM levels WHERE symbol = %s AND timeframe = %s", (symbol, timeframe))
+                else:
+                    cur.execute("SELECT * FROM levels")
                 columns = [desc[0] for desc in cur.description]
                 return [dict(zip(columns, row)) for row in cur.fetchall()]
         except Exception as e:
@@ -464,7 +418,7 @@ class DatabaseManager:
         try:
             conn = self.get_connection()
             with conn.cursor() as cur:
-                cur.execute("SELECT DISTINCT symbol FROM collected_candles")
+                cur.execute("SELECT DISTINCT symbol FROM candle_series")
                 symbols = [row[0] for row in cur.fetchall()]
                 return symbols
         except Exception as e:
@@ -558,12 +512,83 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
 
+    def get_series_depth(self):
+        """Глубина истории рядов: {(symbol, timeframe): (число свечей, open_time самой старой)}"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT symbol, timeframe, COUNT(*), MIN(open_time)
+                    FROM candles
+                    GROUP BY symbol, timeframe
+                """)
+                return {(row[0], row[1]): (row[2], row[3]) for row in cur.fetchall()}
+        except Exception as e:
+            logger.error(f"Ошибка получения глубины рядов: {e}")
+            return {}
+        finally:
+            self.release_connection(conn)
+
+    def get_series_state(self, symbol=None, timeframe=None):
+        """Состояние всех рядов (или одного) одним запросом.
+
+        {(symbol, timeframe): {"last_updated": datetime, "last_open_time": int | None}}
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                if symbol is not None:
+                    cur.execute("""
+                        SELECT symbol, timeframe, last_updated, last_open_time
+                        FROM candle_series
+                        WHERE symbol = %s AND timeframe = %s
+                    """, (symbol, timeframe))
+                else:
+                    cur.execute("SELECT symbol, timeframe, last_updated, last_open_time FROM candle_series")
+                return {
+                    (row[0], row[1]): {"last_updated": row[2], "last_open_time": row[3]}
+                    for row in cur.fetchall()
+                }
+        except Exception as e:
+            logger.error(f"Ошибка получения состояния рядов: {e}")
+            return {}
+        finally:
+            self.release_connection(conn)
+
     def get_current_price(self, symbol, timeframe):
         """Получение текущей цены закрытия"""
-        candles = self.get_candles(symbol, timeframe)
-        if candles:
-            return candles[-1]['close']
-        return None
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT last_close
+                    FROM candle_series
+                    WHERE symbol = %s AND timeframe = %s
+                """, (symbol, timeframe))
+                row = cur.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Ошибка получения цены {symbol} {timeframe}: {e}")
+            return None
+        finally:
+            self.release_connection(conn)
+
+    def get_current_prices(self):
+        """Текущие цены закрытия всех рядов: {(symbol, timeframe): close}"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT symbol, timeframe, last_close
+                    FROM candle_series
+                    WHERE last_close IS NOT NULL
+                """)
+                return {(row[0], row[1]): row[2] for row in cur.fetchall()}
+        except Exception as e:
+            logger.error(f"Ошибка получения текущих цен: {e}")
+            return {}
+        finally:
+            self.release_connection(conn)
 
     def save_alerts(self, alerts):
         conn = self.get_connection()
@@ -672,14 +697,14 @@ class DatabaseManager:
             for s in signals
         ]
 
-        conn = self.connection_pool.getconn()
+        conn = self.get_connection()
         try:
             with conn.cursor() as cur:
                 execute_values(cur, query, values)
             conn.commit()
             logger.info(f"💾 Сохранено {len(signals)} сигналов в базу данных")
         finally:
-            self.connection_pool.putconn(conn)
+            self.release_connection(conn)
 
 
     def get_signals(self, limit=100):
@@ -690,13 +715,13 @@ class DatabaseManager:
         ORDER BY time DESC
         LIMIT %s
         """
-        conn = self.connection_pool.getconn()
+        conn = self.get_connection()
         try:
             with conn.cursor() as cur:
                 cur.execute(query, (limit,))
                 rows = cur.fetchall()
         finally:
-            self.connection_pool.putconn(conn)
+            self.release_connection(conn)
 
         result = []
         for row in rows:
@@ -724,20 +749,162 @@ class DatabaseManager:
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT {", ".join(name.lower() for name in INDICATOR_COLUMNS)}
+                    FROM indicator_values
+                    WHERE symbol = %s AND timeframe = %s
+                """, (symbol, timeframe))
+                row = cur.fetchone()
+                result = {
+                    name: value for name, value in zip(INDICATOR_COLUMNS, row or ()) if value is not None
+                }
                 cur.execute("""
                     SELECT indicator_type, value
-                    FROM indicators
+                    FROM indicator_labels
                     WHERE symbol = %s AND timeframe = %s
-                    ORDER BY created_at DESC
                 """, (symbol, timeframe))
-                rows = cur.fetchall()
-                return {row[0]: row[1] for row in rows}
+                result.update(dict(cur.fetchall()))
+                return result
         except Exception as e:
             logger.error(f"Ошибка получения индикаторов: {e}")
             return {}
         finally:
             self.release_connection(conn)
 
+    def get_indicator_snapshot(self):
+        """Все индикаторы: {(symbol, timeframe): {indicator_type: value}}.
+
+        Числовые значения читаются из indicator_values (одна строка на пару),
+        строковые (RECOMMENDATION) — из indicator_labels.
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT symbol, timeframe, {", ".join(name.lower() for name in INDICATOR_COLUMNS)}
+                    FROM indicator_values
+                """)
+                snapshot = {
+                    (row[0], row[1]): {
+                        name: value for name, value in zip(INDICATOR_COLUMNS, row[2:]) if value is not None
+                    }
+                    for row in cur.fetchall()
+                }
+                cur.execute("SELECT symbol, timeframe, indicator_type, value FROM indicator_labels")
+                for symbol, timeframe, indicator_type, value in cur.fetchall():
+                    snapshot.setdefault((symbol, timeframe), {})[indicator_type] = value
+                return snapshot
+        except Exception as e:
+            logger.error(f"Ошибка получения снимка индикаторов: {e}")
+            return {}
+        finally:
+            self.release_connection(conn)
+
+    def get_indicator_state(self, symbol, timeframe):
+        """Состояние инкрементальных индикаторов ряда: (last_time, state) или None"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT last_time, state
+                    FROM indicator_state
+                    WHERE symbol = %s AND timeframe = %s
+                """, (symbol, timeframe))
+                row = cur.fetchone()
+                return (row[0], row[1]) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка получения состояния индикаторов {symbol} {timeframe}: {e}")
+            return None
+        finally:
+            self.release_connection(conn)
+
+    def save_indicator_state(self, symbol, timeframe, last_time, state):
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO indicator_state (symbol, timeframe, last_time, state, updated_at)
+                    VALUES (%s, %s, %s, %s::jsonb, CURRENT_TIMESTAMP)
+                    ON CONFLICT (symbol, timeframe) DO UPDATE
+                    SET last_time = EXCLUDED.last_time,
+                        state = EXCLUDED.state,
+                        updated_at = EXCLUDED.updated_at
+                """, (symbol, timeframe, last_time, json.dumps(state)))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения состояния индикаторов {symbol} {timeframe}: {e}")
+            conn.rollback()
+        finally:
+            self.release_connection(conn)
+
+    def save_indicator_values(self, rows, source="indicators"):
+        """Пакетная запись значений индикаторов.
+
+        rows — итерируемое из (symbol, timeframe, indicator_type, value).
+        Числовые индикаторы сворачиваются в одну строку indicator_values на
+        пару и пишутся execute_values-пакетом на каждый набор колонок;
+        остальные уходят в indicator_labels. Возвращает количество значений.
+        """
+        wide, labels = {}, {}
+        for symbol, timeframe, indicator_type, value in rows:
+            if isinstance(value, np.generic):
+                value = value.item()
+            if indicator_type in INDICATOR_COLUMNS:
+                try:
+                    value = float(value) if value is not None else None
+                except (TypeError, ValueError):
+                    value = None
+                wide.setdefault((symbol, timeframe), {})[indicator_type.lower()] = value
+            else:
+                labels[(symbol, timeframe, indicator_type)] = None if value is None else str(value)
+
+        # Пары с одинаковым набором колонок пишутся одним INSERT
+        by_columns = {}
+        for key, values in wide.items():
+            columns = tuple(sorted(values))
+            by_columns.setdefault(columns, []).append(key + tuple(values[c] for c in columns))
+
+        total = sum(len(v) for v in wide.values()) + len(labels)
+        if not total:
+            return 0
+
+        start = time.time()
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                for columns, values in by_columns.items():
+                    execute_values(cur, f"""
+                        INSERT INTO indicator_values (symbol, timeframe, {", ".join(columns)}, updated_at)
+                        VALUES %s
+                        ON CONFLICT (symbol, timeframe)
+                        DO UPDATE SET {", ".join(f"{c} = EXCLUDED.{c}" for c in columns)},
+                                      updated_at = EXCLUDED.updated_at
+                    """, values,
+                        template=f"(%s, %s, {', '.join(['%s'] * len(columns))}, CURRENT_TIMESTAMP)",
+                        page_size=len(values))
+                if labels:
+                    execute_values(cur, """
+                        INSERT INTO indicator_labels (symbol, timeframe, indicator_type, value, updated_at)
+                        VALUES %s
+                        ON CONFLICT (symbol, timeframe, indicator_type)
+                        DO UPDATE SET value = EXCLUDED.value,
+                                      updated_at = EXCLUDED.updated_at
+                    """, [key + (value,) for key, value in labels.items()],
+                        template="(%s, %s, %s, %s, CURRENT_TIMESTAMP)", page_size=len(labels))
+            conn.commit()
+            duration = max(time.time() - start, 1e-6)
+            logger.info(
+                f"💾 {source}: сохранено {total} значений за {duration:.2f} сек "
+                f"({total / duration:,.0f} строк/сек)"
+            )
+            return total
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения индикаторов ({source}): {e}", exc_info=True)
+            conn.rollback()
+            return 0
+        finally:
+            self.release_connection(conn)
+
     def get_market_cap(self, days=30):
         """Получение капитализации за последние N дней"""
         conn = self.get_connection()
@@ -777,12 +944,34 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
 
+    def maintain_partitions(self, tables=None):
+        """Нарезает дневные секции наперёд и удаляет истёкшие целиком.
+
+        tables — {таблица: дней хранения}, по умолчанию PARTITION_RETENTION_DAYS.
+        """
+        tables = tables or PARTITION_RETENTION_DAYS
+        conn = self.get_connection()
+        try:
+            for table, keep_days in tables.items():
+                try:
+                    with conn.cursor() as cur:
+                        created = partitions.ensure_partitions(cur, table)
+                        dropped = partitions.drop_expired_partitions(cur, table, keep_days)
+                    conn.commit()
+                    if created or dropped:
+                        logger.info(f"🧹 {table}: создано секций {created}, удалено {dropped} (хранение {keep_days} дн.)")
+                except Exception as e:
+                    logger.error(f"❌ Ошибка обслуживания секций {table}: {e}")
+                    conn.rollback()
+        finally:
+            self.release_connection(conn)
+
     def truncate_all_tables(self):
         """Очистка содержимого всех таблиц"""
         logger.info("⏳ Начало очистки таблиц...")
         tables = [
-            "collected_candles", "levels", "alerts",
-            "pairs_cache", "trend_cache", "indicators", "signals"
+            "candles", "candle_series", "levels", "alerts",
+            "pairs_cache", "trend_cache", "indicator_values", "indicator_labels", "indicator_state", "signals"
         ]
         conn = self.get_connection()
         try:
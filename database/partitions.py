@@ -0,0 +1,105 @@
+import logging
+import re
+from datetime import date, datetime, time, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, секционированные по дням: ключ секционирования и его тип
+# (epoch_ms — BIGINT в миллисекундах, иначе TIMESTAMPTZ). Сутки секций
+# для всех таблиц — UTC, независимо от часового пояса хоста и сессии.
+PARTITIONED_TABLES = {
+    "signals": {"key": "time", "epoch_ms": True},
+    "alerts": {"key": "created_at", "epoch_ms": False},
+    "market_cap": {"key": "fetched_at", "epoch_ms": False},
+}
+
+_PARTITION_RE = re.compile(r"_p(\d{8})$")
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _bounds(table: str, day: date):
+    """Границы [lo, hi) дневной секции в типе ключа таблицы: полночь UTC."""
+    lo = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    hi = lo + timedelta(days=1)
+    if PARTITIONED_TABLES[table]["epoch_ms"]:
+        return int(lo.timestamp() * 1000), int(hi.timestamp() * 1000)
+    return lo, hi
+
+
+def ensure_partitions(cur, table: str, days_ahead: int = 2) -> int:
+    """Создаёт дневные секции на сегодня (UTC) и days_ahead дней вперёд.
+
+    Если в DEFAULT-секции уже лежат строки этого дня, они переносятся
+    в новую секцию перед ATTACH. Возвращает число созданных секций.
+    """
+    key = PARTITIONED_TABLES[table]["key"]
+    today = utc_today()
+    created = 0
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        name = partition_name(table, day)
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cur.fetchone()[0]:
+            continue
+
+        lo, hi = _bounds(table, day)
+        cur.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {key} >= %s AND {key} < %s)",
+            (lo, hi),
+        )
+        if not cur.fetchone()[0]:
+            cur.execute(
+                f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+                (lo, hi),
+            )
+        else:
+            cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            cur.execute(
+                f"WITH moved AS (DELETE FROM {table}_default WHERE {key} >= %s AND {key} < %s RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved",
+                (lo, hi),
+            )
+            cur.execute(
+                f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+                (lo, hi),
+            )
+        created += 1
+    return created
+
+
+def drop_expired_partitions(cur, table: str, keep_days: int) -> int:
+    """Отсоединяет и удаляет дневные секции старше keep_days.
+
+    Строки, попавшие в DEFAULT-секцию (перенос старых данных, сбой часов),
+    дочищаются по ключу. Возвращает число удалённых секций.
+    """
+    cutoff = utc_today() - timedelta(days=keep_days)
+    cur.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+    """, (table,))
+    dropped = 0
+    for (name,) in cur.fetchall():
+        match = _PARTITION_RE.search(name)
+        if not match:
+            continue
+        day = datetime.strptime(match.group(1), "%Y%m%d").date()
+        if day >= cutoff:
+            continue
+        cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+        cur.execute(f"DROP TABLE {name}")
+        dropped += 1
+
+    key = PARTITIONED_TABLES[table]["key"]
+    cur.execute(f"DELETE FROM {table}_default WHERE {key} < %s", (_bounds(table, cutoff)[0],))
+    return dropped
@@ -0,0 +1,124 @@
+import logging
+import sys
+import threading
+import time
+
+import psycopg2
+from psycopg2 import pool
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограммы ожидания соединения, мс
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class InstrumentedPool:
+    """Ленивый ThreadedConnectionPool со счётчиками.
+
+    Соединения к БД открываются при первом getconn, а не при импорте.
+    Потоки сверх maxconn ждут на семафоре (до timeout сек), а не получают
+    PoolError сразу. Считаются выдачи, время ожидания (гистограмма),
+    пик занятых соединений и время удержания по местам вызова.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=30.0, **db_config):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.db_config = db_config
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_hist = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._in_use = 0
+        self._in_use_peak = 0
+        self._holders = {}  # id(conn) → (site, t0)
+        self._hold_by_site = {}  # site → [count, total_sec, max_sec]
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        minconn=self.minconn,
+                        maxconn=self.maxconn,
+                        **self.db_config
+                    )
+                    logger.debug(f"✅ Пул соединений создан ({self.minconn}..{self.maxconn})")
+        return self._pool
+
+    def getconn(self, site=None):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pool.PoolError(f"нет свободных соединений за {self.timeout} сек (max={self.maxconn})")
+        try:
+            conn = self._get_pool().getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        waited = time.perf_counter() - start
+
+        bucket = next((i for i, edge in enumerate(WAIT_BUCKETS_MS) if waited * 1000 <= edge), len(WAIT_BUCKETS_MS))
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._wait_hist[bucket] += 1
+            self._in_use += 1
+            self._in_use_peak = max(self._in_use_peak, self._in_use)
+            self._holders[id(conn)] = (site or "unknown", time.perf_counter())
+        return conn
+
+    def putconn(self, conn):
+        with self._lock:
+            holder = self._holders.pop(id(conn), None)
+            if holder:
+                site, t0 = holder
+                held = time.perf_counter() - t0
+                stat = self._hold_by_site.setdefault(site, [0, 0.0, 0.0])
+                stat[0] += 1
+                stat[1] += held
+                stat[2] = max(stat[2], held)
+                self._in_use -= 1
+        self._get_pool().putconn(conn)
+        if holder:
+            self._slots.release()
+
+    def closeall(self):
+        if self._pool is not None:
+            self._pool.closeall()
+
+    def stats(self) -> dict:
+        """Снимок счётчиков пула."""
+        with self._lock:
+            labels = [f"<={edge}ms" for edge in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                "created": self._pool is not None,
+                "maxconn": self.maxconn,
+                "checkouts": self._checkouts,
+                "in_use": self._in_use,
+                "in_use_peak": self._in_use_peak,
+                "wait_total_sec": round(self._wait_total, 4),
+                "wait_max_sec": round(self._wait_max, 4),
+                "wait_histogram": dict(zip(labels, self._wait_hist)),
+                "hold_by_site": {
+                    site: {
+                        "count": count,
+                        "total_sec": round(total, 4),
+                        "avg_ms": round(total / count * 1000, 2),
+                        "max_ms": round(longest * 1000, 2),
+                    }
+                    for site, (count, total, longest) in self._hold_by_site.items()
+                },
+            }
+
+
+def caller_site(depth=2) -> str:
+    """module.function вызывающего кода для учёта удержания соединений."""
+    frame = sys._getframe(depth)
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
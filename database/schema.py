@@ -1 +1,480 @@
+import logging
+import time
 
+import psycopg2
+import psycopg2.errors
+
+logger = logging.getLogger(__name__)
+
+# Числовые индикаторы: по колонке DOUBLE PRECISION в indicator_values
+INDICATOR_COLUMNS = (
+    "RSI", "MACD", "MACD_HIST", "EMA20", "EMA50", "EMA200",
+    "BB_UPPER", "BB_LOWER", "STOCH_K", "STOCH_D", "OBV", "VWAP", "VPVR_POC", "ATR", "ADX", "SUPERTREND",
+    "OI", "FUND_RATE", "LONGS_RATIO", "SHORTS_RATIO",
+)
+
+# Ключ advisory-lock, чтобы run_full / run_realtime / GUI не мигрировали одновременно
+MIGRATION_LOCK_KEY = 7_402_915
+
+def _to_daily_partitions(table: str, columns: str, key: str, primary_key: str, copy_columns: str) -> list[str]:
+    """DDL перевода таблицы в секционированную по дням (RANGE по key).
+
+    Старая таблица переименовывается, новая создаётся с DEFAULT-секцией,
+    данные переносятся в неё. Дневные секции нарезает database/partitions.py.
+    """
+    return [
+        f"ALTER TABLE IF EXISTS {table} RENAME TO {table}_legacy;",
+        f"ALTER SEQUENCE IF EXISTS {table}_id_seq RENAME TO {table}_legacy_id_seq;",
+        f"""
+        CREATE TABLE {table} (
+            id BIGSERIAL,
+            {columns},
+            PRIMARY KEY ({primary_key})
+        ) PARTITION BY RANGE ({key});
+        """,
+        f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;",
+        f"""
+        INSERT INTO {table} ({copy_columns})
+        SELECT {copy_columns} FROM {table}_legacy
+        ON CONFLICT DO NOTHING;
+        """,
+        f"DROP TABLE {table}_legacy;",
+    ]
+
+
+def _rebuild_daily_partitions(table: str, **kwargs) -> list[str]:
+    """DDL пересоздания уже секционированной таблицы (_to_daily_partitions поверх).
+
+    DEFAULT и дневные секции переименовываются, чтобы освободить имена,
+    и удаляются вместе со старой таблицей после переноса строк.
+    """
+    return [
+        f"""
+        DO $$
+        DECLARE child TEXT;
+        BEGIN
+            FOR child IN
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class p ON p.oid = i.inhparent
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE p.relname = '{table}'
+            LOOP
+                EXECUTE format('ALTER TABLE %I RENAME TO %I', child, child || '_legacy');
+            END LOOP;
+        END $$;
+        """,
+        *_to_daily_partitions(table, **kwargs),
+    ]
+
+
+# ──────────────────────────────────────────────────────────────
+# Реестр миграций: (версия, описание, [DDL...]).
+# Применённые миграции не редактируются — изменения схемы
+# добавляются новой версией в конец списка.
+# ──────────────────────────────────────────────────────────────
+MIGRATIONS = [
+    (1, "базовая схема", [
+        # Таблица levels
+        """
+        CREATE TABLE IF NOT EXISTS levels (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(5) NOT NULL,
+            price DECIMAL(20,8) NOT NULL,
+            type VARCHAR(10) NOT NULL,
+            strength INT NOT NULL,
+            upper DECIMAL(20,8),
+            lower DECIMAL(20,8),
+            distance DECIMAL(10,4),
+            touched INT DEFAULT 0,
+            broken BOOLEAN DEFAULT FALSE,
+            last_touched TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+
+        # Таблица alerts
+        """
+        CREATE TABLE IF NOT EXISTS alerts (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(20),
+            level_price DECIMAL(20,8),
+            current_price DECIMAL(20,8),
+            type VARCHAR(20),
+            distance DECIMAL(10,4),
+            strength INT,
+            timeframe VARCHAR(10),
+            source VARCHAR(20),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        ALTER TABLE alerts
+        ADD COLUMN IF NOT EXISTS source VARCHAR(20);
+        """,
+
+        # Таблица pairs_cache
+        """
+        CREATE TABLE IF NOT EXISTS pairs_cache (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(20) NOT NULL,
+            volume DECIMAL(20,8) NOT NULL,
+            first_seen TIMESTAMP,
+            last_seen TIMESTAMP,
+            missing_periods INT DEFAULT 0
+        );
+        """,
+
+        # Таблица trend_cache
+        """
+        CREATE TABLE IF NOT EXISTS trend_cache (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(20) NOT NULL UNIQUE,
+            direction VARCHAR(10) NOT NULL,
+            ema50 DECIMAL(20,8),
+            ema200 DECIMAL(20,8),
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+
+        # Таблица market_cap
+        """
+        CREATE TABLE IF NOT EXISTS market_cap (
+            id SERIAL PRIMARY KEY,
+            total_cap DECIMAL(20,2) NOT NULL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+
+        # Таблица open_orders
+        """
+        CREATE TABLE IF NOT EXISTS open_orders (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(20),
+            entry_price DECIMAL(20,8),
+            leverage INT,
+            open_time BIGINT,
+            target_price DECIMAL(20,8),
+            stop_loss DECIMAL(20,8),
+            order_id VARCHAR(50)
+        );
+        """,
+
+        # Таблица signals
+        """
+        CREATE TABLE IF NOT EXISTS signals (
+            id SERIAL PRIMARY KEY,
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(5) NOT NULL,
+            signal_type VARCHAR(255) NOT NULL,
+            price DECIMAL(20,8) NOT NULL,
+            time BIGINT NOT NULL,
+            indicator VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        ALTER TABLE signals
+        ADD COLUMN IF NOT EXISTS score INT,
+        ADD COLUMN IF NOT EXISTS details TEXT,
+        ADD COLUMN IF NOT EXISTS recommendation VARCHAR(50),
+        ADD COLUMN IF NOT EXISTS current_price DECIMAL(20,8),
+        ADD COLUMN IF NOT EXISTS rsi DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS macd DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS ema50 DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS ema200 DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS bb_position DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS stoch_k DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS stoch_d DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS atr DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS adx DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS vwap DOUBLE PRECISION,
+        ADD COLUMN IF NOT EXISTS poc DOUBLE PRECISION;
+        """,
+
+        "CREATE INDEX IF NOT EXISTS idx_levels_symbol_timeframe ON levels (symbol, timeframe);",
+        "CREATE INDEX IF NOT EXISTS idx_levels_price ON levels (price);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_signals_unique ON signals (symbol, timeframe, signal_type, time);",
+    ]),
+
+    (2, "построчное хранение свечей", [
+        # Таблица candles: одна строка на свечу
+        """
+        CREATE TABLE IF NOT EXISTS candles (
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(5) NOT NULL,
+            open_time BIGINT NOT NULL,
+            open DOUBLE PRECISION NOT NULL,
+            high DOUBLE PRECISION NOT NULL,
+            low DOUBLE PRECISION NOT NULL,
+            close DOUBLE PRECISION NOT NULL,
+            volume DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (symbol, timeframe, open_time)
+        );
+        """,
+
+        # Таблица candle_series: метаданные ряда (symbol, timeframe)
+        """
+        CREATE TABLE IF NOT EXISTS candle_series (
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(5) NOT NULL,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (symbol, timeframe)
+        );
+        """,
+
+        # Перенос старого JSONB-хранилища collected_candles в candles
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('collected_candles') IS NOT NULL THEN
+                INSERT INTO candles (symbol, timeframe, open_time, open, high, low, close, volume)
+                SELECT cc.symbol,
+                       cc.timeframe,
+                       (c ->> 'time')::BIGINT,
+                       (c ->> 'open')::DOUBLE PRECISION,
+                       (c ->> 'high')::DOUBLE PRECISION,
+                       (c ->> 'low')::DOUBLE PRECISION,
+                       (c ->> 'close')::DOUBLE PRECISION,
+                       (c ->> 'volume')::DOUBLE PRECISION
+                FROM collected_candles cc, jsonb_array_elements(cc.candles) AS c
+                ON CONFLICT DO NOTHING;
+
+                INSERT INTO candle_series (symbol, timeframe, last_updated)
+                SELECT symbol, timeframe, last_updated
+                FROM collected_candles
+                ON CONFLICT DO NOTHING;
+
+                DROP TABLE collected_candles;
+            END IF;
+        END $$;
+        """,
+
+        "CREATE INDEX IF NOT EXISTS idx_candles_tf_open_time ON candles (timeframe, open_time);",
+        "CREATE INDEX IF NOT EXISTS idx_candle_series_last_updated ON candle_series (last_updated);",
+    ]),
+
+    (3, "типизированная таблица индикаторов", [
+        # Таблица indicator_values: одна строка на (symbol, timeframe), колонка на индикатор
+        f"""
+        CREATE TABLE IF NOT EXISTS indicator_values (
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(5) NOT NULL,
+            {", ".join(f"{name.lower()} DOUBLE PRECISION" for name in INDICATOR_COLUMNS)},
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (symbol, timeframe)
+        );
+        """,
+
+        # Таблица indicator_labels: строковые выходы (RECOMMENDATION)
+        """
+        CREATE TABLE IF NOT EXISTS indicator_labels (
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(5) NOT NULL,
+            indicator_type VARCHAR(20) NOT NULL,
+            value VARCHAR(50),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (symbol, timeframe, indicator_type)
+        );
+        """,
+
+        # Старая key/value-таблица indicators (значения пересчитываются каждый прогон)
+        "DROP TABLE IF EXISTS indicators;",
+    ]),
+
+    (4, "секционирование signals, alerts, market_cap по дням", [
+        "DROP INDEX IF EXISTS idx_signals_unique;",
+        *_to_daily_partitions(
+            "signals",
+            columns="""
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(5) NOT NULL,
+            signal_type VARCHAR(255) NOT NULL,
+            price DECIMAL(20,8) NOT NULL,
+            time BIGINT NOT NULL,
+            indicator VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            score INT,
+            details TEXT,
+            recommendation VARCHAR(50),
+            current_price DECIMAL(20,8),
+            rsi DOUBLE PRECISION,
+            macd DOUBLE PRECISION,
+            ema50 DOUBLE PRECISION,
+            ema200 DOUBLE PRECISION,
+            bb_position DOUBLE PRECISION,
+            stoch_k DOUBLE PRECISION,
+            stoch_d DOUBLE PRECISION,
+            atr DOUBLE PRECISION,
+            adx DOUBLE PRECISION,
+            vwap DOUBLE PRECISION,
+            poc DOUBLE PRECISION""",
+            key="time",
+            primary_key="id, time",
+            copy_columns="symbol, timeframe, signal_type, price, time, indicator, created_at, score, details, "
+                         "recommendation, current_price, rsi, macd, ema50, ema200, bb_position, stoch_k, stoch_d, "
+                         "atr, adx, vwap, poc",
+        ),
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_signals_unique ON signals (symbol, timeframe, signal_type, time);",
+
+        *_to_daily_partitions(
+            "alerts",
+            columns="""
+            symbol VARCHAR(20),
+            level_price DECIMAL(20,8),
+            current_price DECIMAL(20,8),
+            type VARCHAR(20),
+            distance DECIMAL(10,4),
+            strength INT,
+            timeframe VARCHAR(10),
+            source VARCHAR(20),
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP""",
+            key="created_at",
+            primary_key="id, created_at",
+            copy_columns="symbol, level_price, current_price, type, distance, strength, timeframe, source, created_at",
+        ),
+        "CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts (created_at);",
+
+        *_to_daily_partitions(
+            "market_cap",
+            columns="""
+            total_cap DECIMAL(20,2) NOT NULL,
+            fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP""",
+            key="fetched_at",
+            primary_key="id, fetched_at",
+            copy_columns="total_cap, fetched_at",
+        ),
+    ]),
+
+    (5, "последняя свеча ряда в candle_series", [
+        """
+        ALTER TABLE candle_series
+        ADD COLUMN IF NOT EXISTS last_open_time BIGINT,
+        ADD COLUMN IF NOT EXISTS last_close DOUBLE PRECISION;
+        """,
+        """
+        UPDATE candle_series s
+        SET last_open_time = l.open_time,
+            last_close = l.close
+        FROM (
+            SELECT DISTINCT ON (symbol, timeframe) symbol, timeframe, open_time, close
+            FROM candles
+            ORDER BY symbol, timeframe, open_time DESC
+        ) l
+        WHERE s.symbol = l.symbol AND s.timeframe = l.timeframe;
+        """,
+    ]),
+    (6, "состояние инкрементальных индикаторов", [
+        """
+        CREATE TABLE IF NOT EXISTS indicator_state (
+            symbol VARCHAR(20) NOT NULL,
+            timeframe VARCHAR(5) NOT NULL,
+            last_time BIGINT NOT NULL,
+            state JSONB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (symbol, timeframe)
+        );
+        """,
+    ]),
+    # Ключи alerts и market_cap были TIMESTAMP в часовом поясе сессии, а
+    # секции signals — сутки UTC. Старые значения переносятся как время
+    # в часовом поясе сессии, выполняющей миграцию.
+    (7, "ключи секций alerts и market_cap в TIMESTAMPTZ", [
+        "DROP INDEX IF EXISTS idx_alerts_created_at;",
+        *_rebuild_daily_partitions(
+            "alerts",
+            columns="""
+            symbol VARCHAR(20),
+            level_price DECIMAL(20,8),
+            current_price DECIMAL(20,8),
+            type VARCHAR(20),
+            distance DECIMAL(10,4),
+            strength INT,
+            timeframe VARCHAR(10),
+            source VARCHAR(20),
+            created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP""",
+            key="created_at",
+            primary_key="id, created_at",
+            copy_columns="symbol, level_price, current_price, type, distance, strength, timeframe, source, created_at",
+        ),
+        "CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts (created_at);",
+
+        *_rebuild_daily_partitions(
+            "market_cap",
+            columns="""
+            total_cap DECIMAL(20,2) NOT NULL,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP""",
+            key="fetched_at",
+            primary_key="id, fetched_at",
+            copy_columns="total_cap, fetched_at",
+        ),
+    ]),
+]
+
+
+def current_version(cur) -> int:
+    """Версия схемы из schema_version; 0 — таблицы ещё нет."""
+    try:
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cur.fetchone()[0]
+    except psycopg2.errors.UndefinedTable:
+        cur.connection.rollback()
+        return 0
+
+
+def apply_migrations(conn) -> int:
+    """Применяет миграции новее записанной версии. Возвращает итоговую версию.
+
+    Ошибка миграции откатывается и пробрасывается: процесс не стартует
+    на частично обновлённой схеме.
+
+    В обычном запуске это один запрос версии. Каждая миграция идёт
+    отдельной транзакцией вместе с записью в schema_version.
+    """
+    latest = MIGRATIONS[-1][0]
+    try:
+        with conn.cursor() as cur:
+            version = current_version(cur)
+        conn.commit()
+        if version >= latest:
+            logger.info(f"✅ Схема БД актуальна (версия {version})")
+            return version
+
+        start = time.time()
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+            try:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INT PRIMARY KEY,
+                        description TEXT,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                conn.commit()
+                # Другой процесс мог успеть мигрировать, пока мы ждали lock
+                version = current_version(cur)
+                for number, description, statements in MIGRATIONS:
+                    if number <= version:
+                        continue
+                    logger.info(f"⏳ Миграция {number}: {description}")
+                    for statement in statements:
+                        cur.execute(statement)
+                    cur.execute(
+                        "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                        (number, description),
+                    )
+                    conn.commit()
+                    version = number
+            finally:
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+                conn.commit()
+
+        logger.info(f"✅ Схема БД обновлена до версии {version} за {time.time() - start:.2f} сек")
+        return version
+    except psycopg2.Error as e:
+        # Запуск на недомигрированной схеме падал бы далеко от причины — прерываем старт
+        logger.error(f"❌ Ошибка миграции схемы: {e}", exc_info=True)
+        conn.rollback()
+        raise
@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 import logging
 from database.database import DatabaseManager
+from services.batch_indicators import IndicatorContext
 
 logger = logging.getLogger(__name__)
 
@@ -29,23 +31,12 @@ class IndicatorDrawer:
             return None
 
         try:
-            # Вычисляем все индикаторы
-            ema20 = df["close"].ewm(span=20, adjust=False).mean()
-            ema50 = df["close"].ewm(span=50, adjust=False).mean()
-            ema200 = df["close"].ewm(span=200, adjust=False).mean()
-
-            bb_mid = df["close"].rolling(window=20).mean()
-            bb_std = df["close"].rolling(window=20).std()
-            bb_upper = bb_mid + 2 * bb_std
-            bb_lower = bb_mid - 2 * bb_std
-
-            # Собираем все значения в один список
+            # Вычисляем все индикаторы и собираем значения в один список
+            context = IndicatorContext.from_series(close=df["close"])
             all_values = []
-            all_values.extend(ema20.dropna().tolist())
-            all_values.extend(ema50.dropna().tolist())
-            all_values.extend(ema200.dropna().tolist())
-            all_values.extend(bb_upper.dropna().tolist())
-            all_values.extend(bb_lower.dropna().tolist())
+            for name in ("ema20", "ema50", "ema200", "bb_upper", "bb_lower"):
+                values = context.series(name)
+                all_values.extend(values[~np.isnan(values)].tolist())
 
             return all_values
         except Exception as e:
@@ -56,21 +47,10 @@ class IndicatorDrawer:
         """Возвращает словарь Series для make_addplot"""
         try:
             close = pd.to_numeric(df["Close"], errors="coerce")
-            ema20 = close.ewm(span=20, adjust=False).mean()
-            ema50 = close.ewm(span=50, adjust=False).mean()
-            ema200 = close.ewm(span=200, adjust=False).mean()
-
-            bb_mid = close.rolling(window=20).mean()
-            bb_std = close.rolling(window=20).std()
-            bb_upper = bb_mid + 2 * bb_std
-            bb_lower = bb_mid - 2 * bb_std
-
+            context = IndicatorContext.from_series(close=close)
             return {
-                "EMA20": ema20,
-                "EMA50": ema50,
-                "EMA200": ema200,
-                "BB_UPPER": bb_upper,
-                "BB_LOWER": bb_lower
+                name.upper(): pd.Series(context.series(name), index=close.index)
+                for name in ("ema20", "ema50", "ema200", "bb_upper", "bb_lower")
             }
         except Exception as e:
             logger.error(f"Ошибка get_indicator_series: {e}")
@@ -94,21 +74,10 @@ class IndicatorDrawer:
 
         try:
             close = pd.to_numeric(df["close"], errors="coerce")
-            ema20 = close.ewm(span=20, adjust=False).mean()
-            ema50 = close.ewm(span=50, adjust=False).mean()
-            ema200 = close.ewm(span=200, adjust=False).mean()
-
-            bb_mid = close.rolling(window=20).mean()
-            bb_std = close.rolling(window=20).std()
-            bb_upper = bb_mid + 2 * bb_std
-            bb_lower = bb_mid - 2 * bb_std
-
+            context = IndicatorContext.from_series(close=close)
             df_ind = pd.DataFrame({
-                "ema20": ema20,
-                "ema50": ema50,
-                "ema200": ema200,
-                "bb_upper": bb_upper,
-                "bb_lower": bb_lower
+                name: context.series(name)
+                for name in ("ema20", "ema50", "ema200", "bb_upper", "bb_lower")
             }, index=df.index).dropna()
 
             if df_ind.empty:
@@ -148,9 +117,9 @@ class IndicatorDrawer:
         ax_stoch.set_ylabel("Stoch")
         ax_stoch.legend(loc="upper left", fontsize=8)
 
-    def _stochastic(self, df, k_period=14, d_period=3):
-        low_min = df["Low"].rolling(window=k_period).min()
-        high_max = df["High"].rolling(window=k_period).max()
-        k = 100 * (df["Close"] - low_min) / (high_max - low_min)
-        d = k.rolling(window=d_period).mean()
-        return k, d
+    def _stochastic(self, df):
+        context = IndicatorContext.from_series(high=df["High"], low=df["Low"], close=df["Close"])
+        return (
+            pd.Series(context.series("stoch_k"), index=df.index),
+            pd.Series(context.series("stoch_d"), index=df.index),
+        )
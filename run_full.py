@@ -3,19 +3,18 @@
 import asyncio
 import logging
 import time
-from datetime import datetime, timedelta, timezone
 from concurrent.futures import ThreadPoolExecutor
 import argparse
 
 from services.worker            import SignalWorker
 from services.identifier        import PairIdentifier
 from services.collector         import DataCollector
-from services.level_engine      import LevelAnalyzer
-from services.indicator_engine  import IndicatorEngine
-from services.trend_engine      import TrendAnalyzer
+from services.analysis_pool     import AnalysisPool
 from services.signal_engine     import SignalEngine
 from services.alert_engine      import AlertSystem
 from services.deep_an           import MarketCapTracker
+from services.rate_limiter      import BinanceScheduler
+from services.http_client       import HttpClient
 from database.database          import DatabaseManager
 
 # ──────────────────────────────────────────────────────────────
@@ -46,10 +45,8 @@ async def update_market_data():
     )
 
 def analyze_all():
-    """Анализ уровней, индикаторов, трендов"""
-    LevelAnalyzer().analyze_levels()
-    IndicatorEngine().compute_indicators()
-    TrendAnalyzer().analyze_trends()
+    """Анализ уровней, индикаторов, трендов (ANALYZE_BACKEND / ANALYZE_WORKERS)"""
+    AnalysisPool().run()
     AlertSystem().check_alerts()
 
 def generate_signals():
@@ -58,26 +55,20 @@ def generate_signals():
 def evaluate_signals():
     return SignalWorker().process_all_pairs()
 
-def clean_old_signals(days=2):
-    """Удаляет сигналы старше N дней"""
-    db = DatabaseManager()
-    cutoff = int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp() * 1000)
-    with db.get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM signals WHERE time < %s", (cutoff,))
-            conn.commit()
-    logger.info(f"🧹 Удалены сигналы старше {days} дней")
-
 # ──────────────────────────────────────────────────────────────
 async def main(mode):
     logger.info(f"🚀 Запуск режима: {mode}")
     db = DatabaseManager()
     db.clear_old_candles()
-    clean_old_signals()
+    db.maintain_partitions()
 
     loop = asyncio.get_running_loop()
     executor = ThreadPoolExecutor()
 
+    if mode == "backfill":
+        await PairIdentifier().update_pairs_cache()
+        await DataCollector().backfill()
+
     if mode in ("all", "update"):
         await update_market_data()
         await loop.run_in_executor(executor, wait_for_candles)
@@ -94,13 +85,18 @@ async def main(mode):
         else:
             logger.info("⚠️ Нет подходящих сигналов после оценки")
 
+    await HttpClient().close()
+    db.log_pool_stats()
+    HttpClient().log_stats()
+    BinanceScheduler().log_stats()
+
 # ──────────────────────────────────────────────────────────────
 if __name__ == "__main__":
     DatabaseManager.init_schema_once()
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("--mode", type=str, choices=["all", "update", "analyze", "signals"], default="all",
-                        help="Выбери режим: all | update | analyze | signals")
+    parser.add_argument("--mode", type=str, choices=["all", "update", "analyze", "signals", "backfill"],
+                        default="all", help="Выбери режим: all | update | analyze | signals | backfill")
     args = parser.parse_args()
 
     asyncio.run(main(args.mode))
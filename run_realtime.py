@@ -1,9 +1,12 @@
 # run_realtime.py
 
+import argparse
 import asyncio
 import logging
-from datetime import datetime, timedelta
-from services.collector import DataCollector
+from config.constants import BASE_TIMEFRAME, CANDLE_SETTINGS
+from services.collector import DataCollector, EXCLUDED_STABLES
+from services.kline_stream import KlineStream
+from services.http_client import HttpClient
 from services.indicator_engine import IndicatorEngine
 from services.signal_engine import SignalEngine
 from database.database import DatabaseManager
@@ -16,46 +19,86 @@ logger.addHandler(handler)
 
 # Интервал обновления в секундах (например, каждые 5 минут)
 UPDATE_INTERVAL = 300
+# Интервал обслуживания секций в режиме stream
+MAINTENANCE_INTERVAL = 3600
 
-async def update_symbol_tf(symbol, timeframe):
+async def update_symbol_tf(symbol, timeframe, window=None):
     try:
         logger.info(f"🔄 Обновление {symbol} / {timeframe}")
 
         # 1. Обновление свечей
-        updated = await DataCollector().update_one(symbol, timeframe)
+        updated = await DataCollector().update_one(symbol, timeframe, window)
         if not updated:
             logger.info(f"⏭ Нет новых свечей для {symbol} / {timeframe}")
             return
 
-        # 2. Пересчёт индикаторов
-        IndicatorEngine().compute_single(symbol, timeframe)
-
-        # 3. Генерация сигналов
-        SignalEngine().generate_single(symbol, timeframe)
+        # 2–3. Пересчёт индикаторов и сигналов ряда (синхронные запросы к БД — в пуле потоков)
+        await asyncio.get_running_loop().run_in_executor(None, recompute_series, symbol, timeframe)
 
         logger.info(f"✅ Завершено обновление: {symbol} / {timeframe}")
 
     except Exception as e:
         logger.error(f"❌ Ошибка при обновлении {symbol} / {timeframe}: {e}")
 
+def recompute_series(symbol, timeframe):
+    """Индикаторы и сигналы одного ряда после прихода новых свечей."""
+    IndicatorEngine().compute_single(symbol, timeframe)
+    SignalEngine().generate_single(symbol, timeframe)
+
 async def realtime_loop():
     db = DatabaseManager()
-    symbols = db.get_symbols_from_cache()
-    timeframes = ["1d", "4h", "1h", "15m", "5m"]
+    symbols = [s for s in db.get_symbols_from_cache() if not any(stable in s for stable in EXCLUDED_STABLES)]
 
     while True:
         logger.info("🚀 Запуск итерации реального времени")
-        tasks = []
-        now = datetime.utcnow()
+        db.maintain_partitions()
 
-        for symbol in symbols:
-            for tf in timeframes:
-                # TODO: добавить проверку: нужно ли обновление
-                tasks.append(update_symbol_tf(symbol, tf))
-
-        await asyncio.gather(*tasks)
+        # Только ряды, у которых подошёл срок обновления (CANDLE_SETTINGS update_freq).
+        # Сначала базовый таймфрейм: старшие собираются из уже обновлённой базы.
+        plan = DataCollector().plan_refresh(symbols)
+        await asyncio.gather(*[
+            update_symbol_tf(symbol, tf, (start, limit)) for symbol, tf, start, limit in plan if tf == BASE_TIMEFRAME
+        ])
+        await asyncio.gather(*[
+            update_symbol_tf(symbol, tf, (start, limit)) for symbol, tf, start, limit in plan if tf != BASE_TIMEFRAME
+        ])
         logger.info("🛑 Итерация завершена, спим...")
         await asyncio.sleep(UPDATE_INTERVAL)
 
+async def maintenance_loop():
+    db = DatabaseManager()
+    loop = asyncio.get_running_loop()
+    while True:
+        await loop.run_in_executor(None, db.maintain_partitions)
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+async def stream_loop():
+    """Свечи приходят из kline-потоков Binance вместо опроса REST."""
+    db = DatabaseManager()
+    symbols = [s for s in db.get_symbols_from_cache() if not any(stable in s for stable in EXCLUDED_STABLES)]
+    if not symbols:
+        logger.warning("⚠️ Нет символов для подписки")
+        return
+
+    loop = asyncio.get_running_loop()
+
+    async def on_closed(series):
+        # Закрытая свеча — пересчёт индикаторов и сигналов только этого ряда
+        await asyncio.gather(*[
+            loop.run_in_executor(None, recompute_series, symbol, timeframe) for symbol, timeframe in series
+        ])
+
+    stream = KlineStream(symbols, list(CANDLE_SETTINGS), on_closed=on_closed)
+    try:
+        await asyncio.gather(stream.run(), maintenance_loop())
+    finally:
+        stream.log_stats()
+        await HttpClient().close()
+
 if __name__ == "__main__":
-    asyncio.run(realtime_loop())
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", type=str, choices=["stream", "poll"], default="stream",
+                        help="stream — WebSocket kline-потоки, poll — опрос REST каждые UPDATE_INTERVAL сек")
+    args = parser.parse_args()
+
+    asyncio.run(stream_loop() if args.mode == "stream" else realtime_loop())
\ No newline at end of file
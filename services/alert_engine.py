@@ -15,7 +15,25 @@ class AlertSystem:
         """
         Возвращает список алертов по близости к уровням.
         """
-        levels = self.db.get_levels()
+        alerts = self._match_levels(self.db.get_levels(), self.db.get_current_prices(), distance_threshold)
+
+        logger.info(f"🔔 Обнаружено алертов: {len(alerts)}")
+        self.db.save_alerts(alerts)
+        return alerts
+
+    def check_series(self, symbol, timeframe, distance_threshold=1.0):
+        """Алерты одного ряда: уровни (symbol, timeframe) против его последней цены."""
+        price = self.db.get_current_price(symbol, timeframe)
+        if price is None:
+            return []
+        alerts = self._match_levels(
+            self.db.get_levels(symbol, timeframe), {(symbol, timeframe): price}, distance_threshold
+        )
+        if alerts:
+            self.db.save_alerts(alerts)
+        return alerts
+
+    def _match_levels(self, levels, prices, distance_threshold):
         alerts = []
 
         for lvl in levels:
@@ -27,7 +45,7 @@ class AlertSystem:
             if any(stable in symbol for stable in EXCLUDED_STABLES):
                 continue
 
-            current_price = self.db.get_current_price(symbol, timeframe)
+            current_price = prices.get((symbol, timeframe))
             if current_price is None:
                 continue
 
@@ -49,6 +67,4 @@ class AlertSystem:
 
             alerts.append(alert)
 
-        logger.info(f"🔔 Обнаружено алертов: {len(alerts)}")
-        self.db.save_alerts(alerts)
         return alerts
@@ -0,0 +1,101 @@
+import logging
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config.constants import ANALYZE_BACKEND, ANALYZE_WORKERS
+from database.database import DatabaseManager
+from services import batch_indicators
+from services.indicator_engine import IndicatorEngine
+from services.level_engine import LevelAnalyzer
+from services.trend_engine import TrendAnalyzer
+
+logger = logging.getLogger(__name__)
+
+_engines = None
+
+
+def _analyze_shard(tf, keys, arrays):
+    """Уровни, индикаторы и EMA тренда для шарда рядов одного таймфрейма.
+
+    Выполняется в процессе пула: на входе матрицы pack_candles, на выходе
+    только результаты — в БД воркер не ходит (соединения пула DatabaseManager
+    открываются лениво и здесь не создаются).
+    """
+    global _engines
+    if _engines is None:
+        _engines = (LevelAnalyzer(), IndicatorEngine(), TrendAnalyzer())
+    levels, indicators, trends = _engines
+    # Общий контекст шарда: EMA/ATR считаются один раз для всех движков
+    context = batch_indicators.IndicatorContext(arrays)
+    return (
+        levels.compute_batch(tf, keys, context),
+        indicators.compute_batch(tf, keys, context),
+        trends.compute_batch(tf, keys, context),
+    )
+
+
+class AnalysisPool:
+    """Анализ всех рядов (уровни, индикаторы, тренды) с общей записью в БД.
+
+    Ряды каждого таймфрейма упаковываются в матрицы symbols × bars и режутся
+    по строкам на шарды — примерно по одному на воркер. backend="process"
+    считает шарды в пуле процессов (spawn: родитель держит потоки и
+    соединения с БД, fork их бы унаследовал), "serial" — в текущем процессе
+    тем же кодом. Результаты собираются и пишутся по одной пачке на таблицу.
+    """
+
+    def __init__(self, backend=ANALYZE_BACKEND, workers=ANALYZE_WORKERS):
+        if backend not in ("process", "serial"):
+            raise ValueError(f"Неизвестный backend анализа: {backend}")
+        self.db = DatabaseManager()
+        self.backend = backend
+        self.workers = max(1, workers)
+
+    def shards(self, all_candles):
+        """(tf, keys, arrays) — шарды рядов; матрицы обрезаны до самого длинного ряда шарда."""
+        shards = []
+        for tf, group in batch_indicators.group_by_timeframe(all_candles).items():
+            keys, arrays = batch_indicators.pack_candles(group, min_length=100)
+            if not keys:
+                continue
+            size = math.ceil(len(keys) / self.workers)
+            for start in range(0, len(keys), size):
+                rows = slice(start, start + size)
+                shard_keys, shard_arrays = batch_indicators.select_rows(
+                    keys[rows], {field: values[rows] for field, values in arrays.items()}
+                )
+                shards.append((tf, shard_keys, shard_arrays))
+        return shards
+
+    def run(self):
+        started = time.perf_counter()
+        all_candles = self.db.get_all_candles()
+        shards = self.shards(all_candles)
+
+        if self.backend == "process" and self.workers > 1 and len(shards) > 1:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(shards)), mp_context=context) as pool:
+                results = list(pool.map(_analyze_shard, *zip(*shards)))
+        else:
+            results = [_analyze_shard(*shard) for shard in shards]
+
+        levels, indicators, emas = [], [], {}
+        for shard_levels, shard_indicators, shard_emas in results:
+            levels.extend(shard_levels)
+            indicators.extend(shard_indicators)
+            emas.update(shard_emas)
+        computed = time.perf_counter()
+
+        merged = LevelAnalyzer()._merge_levels(levels)
+        trends = TrendAnalyzer().build_trends(all_candles, emas)
+        self.db.save_levels(merged)
+        IndicatorEngine()._save_indicators(indicators)
+        self.db.save_trends(trends)
+
+        logger.info(
+            f"📊 Анализ {len(all_candles)} рядов в {len(shards)} шардах ({self.backend}, воркеров {self.workers}): "
+            f"чтение и расчёт {computed - started:.2f} сек, запись {time.perf_counter() - computed:.2f} сек"
+        )
+        return merged, indicators, trends
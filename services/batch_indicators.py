@@ -0,0 +1,327 @@
+import numpy as np
+
+# Индикаторы сразу по всем рядам таймфрейма: матрицы symbols × bars.
+# Ряды выровнены по последней свече (справа), слева дополнены NaN —
+# каждый ряд начинается со своей первой свечи, как отдельный DataFrame.
+# Ядра повторяют семантику pandas из IndicatorEngine (ewm, rolling с
+# min_periods = окну, fillna только внутри ряда).
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def pack_candles(candles_by_key: dict, min_length: int = 1):
+    """{key: [candles]} → (keys, {field: матрица len(keys) × max_len}).
+
+    Ряды короче min_length пропускаются; порядок keys — порядок словаря.
+    """
+    keys = [key for key, candles in candles_by_key.items() if len(candles) >= min_length]
+    width = max((len(candles_by_key[key]) for key in keys), default=0)
+    arrays = {field: np.full((len(keys), width), np.nan) for field in FIELDS}
+    for row, key in enumerate(keys):
+        candles = candles_by_key[key]
+        values = np.array([[c[field] for field in FIELDS] for c in candles], dtype=np.float64)
+        for col, field in enumerate(FIELDS):
+            arrays[field][row, width - len(candles):] = values[:, col]
+    return keys, arrays
+
+
+def series_lengths(arrays):
+    """Число свечей каждого ряда (без левого дополнения)."""
+    return (~np.isnan(arrays["close"])).sum(axis=1)
+
+
+def select_rows(keys, arrays, min_length=1):
+    """Ряды не короче min_length; общее дополнение слева обрезается."""
+    lengths = series_lengths(arrays)
+    rows = np.flatnonzero(lengths >= min_length)
+    width = int(lengths[rows].max()) if len(rows) else 0
+    start = arrays["close"].shape[1] - width
+    return [keys[row] for row in rows], {field: values[rows, start:] for field, values in arrays.items()}
+
+
+def group_by_timeframe(candles_by_key: dict) -> dict:
+    """{(symbol, tf): candles} → {tf: {(symbol, tf): candles}} с сохранением порядка."""
+    groups = {}
+    for key, candles in candles_by_key.items():
+        groups.setdefault(key[1], {})[key] = candles
+    return groups
+
+
+# -------------------------------------------------
+# Базовые ядра по оси времени
+# -------------------------------------------------
+def ema(x, span, adjust=False):
+    """ewm(span).mean() построчно; ведущие NaN пропускаются, как в pandas."""
+    alpha = 2 / (span + 1)
+    new_wt = 1.0 if adjust else alpha
+    factor = 1 - alpha
+    out = np.full(x.shape, np.nan)
+    weighted = np.full(x.shape[0], np.nan)
+    old_wt = np.ones(x.shape[0])
+    with np.errstate(invalid="ignore"):
+        for t in range(x.shape[1]):
+            cur = x[:, t]
+            has, obs = ~np.isnan(weighted), ~np.isnan(cur)
+            w = old_wt * factor
+            step = has & obs
+            weighted = np.where(step, (w * weighted + new_wt * cur) / (w + new_wt), np.where(obs, cur, weighted))
+            # Пропуск внутри ряда только ослабляет прошлый вес (ignore_na=False)
+            old_wt = np.where(step, w + new_wt if adjust else 1.0, np.where(has, w, 1.0))
+            out[:, t] = weighted
+    return out
+
+
+def _windows(x, window):
+    # Срезы окна: k-й срез — значения со сдвигом k от начала окна
+    n = x.shape[1] - window + 1
+    return [x[:, k:k + n] for k in range(window)]
+
+
+def rolling_mean(x, window):
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        out[:, window - 1:] = sum(_windows(x, window)) / window
+    return out
+
+
+def rolling_std(x, window):
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        parts = _windows(x, window)
+        mean = sum(parts) / window
+        out[:, window - 1:] = np.sqrt(sum((p - mean) ** 2 for p in parts) / (window - 1))
+    return out
+
+
+def rolling_min(x, window):
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        # np.minimum распространяет NaN: неполное окно → NaN
+        out[:, window - 1:] = np.minimum.reduce(_windows(x, window))
+    return out
+
+
+def rolling_max(x, window):
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= window:
+        out[:, window - 1:] = np.maximum.reduce(_windows(x, window))
+    return out
+
+
+def diff(x):
+    out = np.full(x.shape, np.nan)
+    out[:, 1:] = x[:, 1:] - x[:, :-1]
+    return out
+
+
+def shift(x):
+    out = np.full(x.shape, np.nan)
+    out[:, 1:] = x[:, :-1]
+    return out
+
+
+def centered(x, period):
+    """Сдвиг результата окна 2·period+1 к его центру (rolling(center=True))."""
+    out = np.full(x.shape, np.nan)
+    out[:, :x.shape[1] - period] = x[:, period:]
+    return out
+
+
+# -------------------------------------------------
+# Индикаторы
+# -------------------------------------------------
+def rsi(close, period=14):
+    pad = np.isnan(close)
+    delta = diff(close)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = -np.where(delta < 0, delta, 0.0)
+    gain[pad] = loss[pad] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = rolling_mean(gain, period) / rolling_mean(loss, period)
+        return 100 - (100 / (1 + rs))
+
+
+def stochastic_k(high, low, close, k_period=14):
+    low_min = rolling_min(low, k_period)
+    high_max = rolling_max(high, k_period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 * (close - low_min) / (high_max - low_min)
+
+
+def obv(close, volume):
+    pad = np.isnan(close)
+    direction = np.sign(np.nan_to_num(diff(close)))
+    out = np.cumsum(np.where(pad, 0.0, volume * direction), axis=1)
+    out[pad] = np.nan
+    return out
+
+
+def vwap(high, low, close, volume, period=20):
+    pv = (high + low + close) / 3 * volume
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return rolling_mean(pv, period) / rolling_mean(volume, period)
+
+
+def vpvr_poc(close, volume, bins=24):
+    """POC по всем свечам каждого ряда: вектор длины rows."""
+    out = np.full(close.shape[0], np.nan)
+    for row in range(close.shape[0]):
+        valid = ~np.isnan(close[row])
+        if not valid.any():
+            continue
+        hist, edges = np.histogram(close[row, valid], bins=bins, weights=volume[row, valid])
+        idx = hist.argmax()
+        out[row] = (edges[idx] + edges[idx + 1]) / 2
+    return out
+
+
+def true_range(high, low, close):
+    prev = shift(close)
+    # max(axis=1) в pandas пропускает NaN: на первой свече остаётся high − low
+    return np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+
+
+def adx(high, low, close, tr=None, period=14):
+    pad = np.isnan(close)
+    up = diff(high)
+    dn = -diff(low)
+    plus_dm = np.where((up > dn) & (up > 0), up, 0.0)
+    minus_dm = np.where((dn > up) & (dn > 0), dn, 0.0)
+    plus_dm[pad] = minus_dm[pad] = np.nan
+    if tr is None:
+        tr = true_range(high, low, close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plus_di = 100 * ema(plus_dm, period, adjust=True) / tr
+        minus_di = 100 * ema(minus_dm, period, adjust=True) / tr
+        dx = np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    dx = np.where(np.isnan(dx) & ~pad, 0.0, dx) * 100
+    return ema(dx, period, adjust=True)
+
+
+def supertrend(high, low, close, atr_values, factor=3):
+    """SuperTrend: (trend, upper, lower) — направление (bool) и итоговые полосы.
+
+    На дополнении trend — True, как у начала ряда.
+    """
+    hl2 = (high + low) / 2
+    upper = hl2 + factor * atr_values
+    lower = hl2 - factor * atr_values
+    trend = np.ones(close.shape, dtype=bool)
+    for t in range(1, close.shape[1]):
+        up = close[:, t] > upper[:, t - 1]
+        down = ~up & (close[:, t] < lower[:, t - 1])
+        hold = ~up & ~down
+        trend[:, t] = up | (hold & trend[:, t - 1])
+        keep_upper = hold & trend[:, t] & (upper[:, t - 1] < upper[:, t])
+        keep_lower = hold & ~trend[:, t] & (lower[:, t - 1] > lower[:, t])
+        upper[keep_upper, t] = upper[keep_upper, t - 1]
+        lower[keep_lower, t] = lower[keep_lower, t - 1]
+    return trend, upper, lower
+
+
+def pivots(high, low, period):
+    """Фрактальные экстремумы: (ph, pl) — цена, если бар — максимум/минимум окна ±period, иначе NaN."""
+    window = 2 * period + 1
+    high_max = centered(rolling_max(high, window), period)
+    low_min = centered(rolling_min(low, window), period)
+    return np.where(high == high_max, high, np.nan), np.where(low == low_min, low, np.nan)
+
+
+# -------------------------------------------------
+# Граф индикаторов
+# -------------------------------------------------
+# Имя → (входы, функция). Входы — столбцы OHLCV или другие индикаторы;
+# IndicatorContext считает каждый узел один раз на свой набор рядов.
+INDICATORS = {}
+
+
+def register(name, inputs, fn):
+    INDICATORS[name] = (tuple(inputs), fn)
+
+
+for _span in (12, 20, 26, 50, 200):
+    register(f"ema{_span}", ["close"], lambda close, span=_span: ema(close, span))
+
+register("macd_line", ["ema12", "ema26"], np.subtract)
+register("macd_signal", ["macd_line"], lambda line: ema(line, 9))
+register("macd_hist", ["macd_line", "macd_signal"], np.subtract)
+register("rsi", ["close"], rsi)
+register("bb_middle", ["close"], lambda close: rolling_mean(close, 20))
+register("bb_std", ["close"], lambda close: rolling_std(close, 20))
+register("bb_upper", ["bb_middle", "bb_std"], lambda middle, std: middle + 2 * std)
+register("bb_lower", ["bb_middle", "bb_std"], lambda middle, std: middle - 2 * std)
+register("stoch_k", ["high", "low", "close"], stochastic_k)
+register("stoch_d", ["stoch_k"], lambda k: rolling_mean(k, 3))
+register("obv", ["close", "volume"], obv)
+register("vwap", ["high", "low", "close", "volume"], vwap)
+register("poc", ["close", "volume"], vpvr_poc)
+register("true_range", ["high", "low", "close"], true_range)
+register("atr", ["true_range"], lambda tr: rolling_mean(tr, 14))
+register("adx", ["high", "low", "close", "true_range"], adx)
+register("supertrend_bands", ["high", "low", "close", "atr"], supertrend)
+register("supertrend", ["supertrend_bands"], lambda bands: bands[0])
+register("supertrend_upper", ["supertrend_bands"], lambda bands: bands[1])
+register("supertrend_lower", ["supertrend_bands"], lambda bands: bands[2])
+
+
+class IndicatorContext:
+    """Мемоизирующее вычисление индикаторов из INDICATORS.
+
+    Работает над матрицами symbols × bars (шард таймфрейма) или над одним
+    рядом (from_series — матрица 1 × bars). context["ema50"] считает узел
+    и его входы при первом обращении, дальше отдаёт готовый массив — EMA,
+    true range и ATR считаются один раз, сколько бы движков их ни спросило.
+    """
+
+    def __init__(self, arrays):
+        self._values = dict(arrays)
+
+    @classmethod
+    def from_series(cls, **columns):
+        """Контекст одного ряда: from_series(close=..., high=...) — массивы или pandas Series."""
+        return cls({name: np.asarray(values, dtype=np.float64)[np.newaxis, :] for name, values in columns.items()})
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            inputs, fn = INDICATORS[name]
+            self._values[name] = fn(*(self[dependency] for dependency in inputs))
+        return self._values[name]
+
+    def series(self, name):
+        """Значения единственного ряда контекста (для from_series)."""
+        return self[name][0]
+
+    def last(self, name):
+        """Значение на последней свече по каждому ряду."""
+        values = self[name]
+        return values if values.ndim == 1 else values[:, -1]
+
+    @property
+    def rows(self):
+        return self["close"].shape[0]
+
+    @property
+    def lengths(self):
+        return series_lengths(self._values)
+
+
+SNAPSHOT_FIELDS = (
+    "rsi", "macd_line", "macd_signal", "macd_hist", "ema20", "ema50", "ema200",
+    "bb_upper", "bb_middle", "bb_lower", "stoch_k", "stoch_d", "obv", "vwap", "poc",
+    "atr", "adx", "supertrend",
+)
+
+
+def indicator_snapshot(context, rows=None) -> list[dict]:
+    """Значения индикаторов на последней свече рядов контекста (все или rows).
+
+    Ключи совпадают с IndicatorState.values(), поэтому записи для таблицы
+    indicators собираются тем же IndicatorEngine._record_from_values.
+    """
+    if rows is None:
+        rows = range(context.rows)
+    if not len(rows) or not context["close"].size:
+        return []
+    last = {name: context.last(name) for name in SNAPSHOT_FIELDS}
+    last["last_close"] = context.last("close")
+    return [{name: values[row].item() for name, values in last.items()} for row in rows]
@@ -1,51 +1,142 @@
 import asyncio
-import aiohttp
 import logging
-import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from database.database import DatabaseManager
-from config.constants import BINANCE_TICKER_URL, CANDLE_SETTINGS
+from config.constants import (
+    BINANCE_TICKER_URL, BINANCE_KLINES_URL, BASE_TIMEFRAME, BINANCE_MAX_IN_FLIGHT, CANDLE_SETTINGS,
+    KLINES_PAGE_LIMIT, TIMEFRAME_MS,
+)
+from services.http_client import HttpClient
+from services.resampler import can_resample, resample_candles
 
 logger = logging.getLogger(__name__)
 
 TIMEFRAMES = ["1d", "4h", "1h", "15m"]
+# Старшие таймфреймы, которые собираются из BASE_TIMEFRAME, и глубина хранимой базы
+DERIVED_TIMEFRAMES = [tf for tf in CANDLE_SETTINGS if can_resample(BASE_TIMEFRAME, tf)]
+BASE_COVERAGE_MS = CANDLE_SETTINGS[BASE_TIMEFRAME]["limit"] * TIMEFRAME_MS[BASE_TIMEFRAME]
+# Конвейер загрузки: рядов в очереди на запись и рядов в одной пачке записи
+WRITE_QUEUE_SIZE = 64
+WRITE_BATCH_SIZE = 32
 EXCLUDED_STABLES = {"USDC", "BUSD", "TUSD", "PAX", "USDP", "DAI", "FDUSD", "EUR", "UST", "USDD", "SUSD", "USD1", "XUSD"}
 
 
 class DataCollector:
     def __init__(self):
         self.db = DatabaseManager()
+        self.http = HttpClient()
 
     # -------------------------------------------------
     # 1. Загрузка свечей для одной пары-таймфрейма
     # -------------------------------------------------
-    async def fetch_candles(self, session, symbol: str, interval: str):
-        url = f"https://api.binance.com/api/v3/klines?symbol={symbol}&interval={interval}&limit=500"
+    async def fetch_candles(self, symbol: str, interval: str, start_time: int | None = None, limit: int = 500,
+                            end_time: int | None = None):
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = start_time
+        if end_time is not None:
+            params["endTime"] = end_time
         try:
-            async with session.get(url, timeout=10) as resp:
-                if resp.status != 200:
-                    logger.error(f"❌ Ошибка загрузки {symbol} {interval}: {resp.status}")
-                    return symbol, interval, []
-
-                data = await resp.json()
-                candles = [
-                    {
-                        "time":   int(c[0]),
-                        "open":   float(c[1]),
-                        "high":   float(c[2]),
-                        "low":    float(c[3]),
-                        "close":  float(c[4]),
-                        "volume": float(c[5])
-                    }
-                    for c in data
-                ]
-                return symbol, interval, candles
+            status, data = await self.http.binance_json(BINANCE_KLINES_URL, params=params, timeout=10)
+            if status != 200:
+                logger.error(f"❌ Ошибка загрузки {symbol} {interval}: {status}")
+                return symbol, interval, []
+
+            candles = [
+                {
+                    "time":   int(c[0]),
+                    "open":   float(c[1]),
+                    "high":   float(c[2]),
+                    "low":    float(c[3]),
+                    "close":  float(c[4]),
+                    "volume": float(c[5])
+                }
+                for c in data
+            ]
+            return symbol, interval, candles
 
         except Exception as e:
             logger.error(f"❌ Ошибка подключения {symbol} {interval}: {e}")
             return symbol, interval, []
 
+    @staticmethod
+    def _fetch_window(timeframe: str, cursor: int | None, now_ms: int):
+        """(startTime, limit) для ряда по его курсору — open_time последней свечи.
+
+        Известный ряд догружается с последней свечи (она могла быть
+        незакрытой); новый ряд или ряд с разрывом больше страницы
+        загружается последней страницей глубиной CANDLE_SETTINGS limit.
+        """
+        depth = min(CANDLE_SETTINGS.get(timeframe, {}).get("limit", 500), KLINES_PAGE_LIMIT)
+        if cursor is None:
+            return None, depth
+        missing = (now_ms - cursor) // TIMEFRAME_MS[timeframe] + 1
+        if missing >= KLINES_PAGE_LIMIT:
+            return None, depth
+        return cursor, int(missing) + 1
+
+    @staticmethod
+    def _derivable(timeframe: str, start: int | None, now_ms: int) -> bool:
+        """Ряд догружается сборкой из базы: он старший и его курсор внутри окна хранимой базы."""
+        return timeframe in DERIVED_TIMEFRAMES and start is not None and now_ms - start < BASE_COVERAGE_MS
+
+    def plan_refresh(self, symbols):
+        """Ряды к обновлению: [(symbol, timeframe, startTime, limit)], самые устаревшие первыми.
+
+        Свежесть и курсоры всех рядов читаются одним запросом, срок
+        обновления (CANDLE_SETTINGS update_freq) сверяется в памяти.
+        Ряды без истории идут в начале списка.
+        """
+        state = self.db.get_series_state()
+        now = datetime.now()
+        now_ms = int(time.time() * 1000)
+
+        due = []
+        for s in symbols:
+            for tf, cfg in CANDLE_SETTINGS.items():
+                series = state.get((s, tf))
+                if series is None or series["last_updated"] is None:
+                    staleness = float("inf")
+                else:
+                    staleness = (now - series["last_updated"]).total_seconds() / cfg["update_freq"]
+                    if staleness <= 1:
+                        continue
+                cursor = series["last_open_time"] if series else None
+                start, limit = self._fetch_window(tf, cursor, now_ms)
+                due.append((staleness, s, tf, start, limit))
+
+        due.sort(key=lambda item: item[0], reverse=True)
+        return [(s, tf, start, limit) for _, s, tf, start, limit in due]
+
+    async def update_one(self, symbol: str, timeframe: str, window=None) -> int:
+        """Догружает один ряд от последней сохранённой свечи; возвращает число новых свечей.
+
+        window — (start, limit) из plan_refresh; без него окно считается по
+        состоянию ряда в БД. Старший таймфрейм в пределах окна базы
+        собирается из сохранённых свечей BASE_TIMEFRAME без запроса к бирже.
+        Запросы к БД идут в пуле потоков, чтобы не блокировать event loop.
+        """
+        loop = asyncio.get_running_loop()
+        now_ms = int(time.time() * 1000)
+        if window is None:
+            state = await loop.run_in_executor(None, self.db.get_series_state, symbol, timeframe)
+            series = state.get((symbol, timeframe))
+            window = self._fetch_window(timeframe, series["last_open_time"] if series else None, now_ms)
+        start, limit = window
+
+        if self._derivable(timeframe, start, now_ms):
+            merged = await loop.run_in_executor(None, self.derive_timeframes, {symbol: start}, [timeframe])
+            return merged.get((symbol, timeframe), {}).get("new", 0)
+
+        result = await self.fetch_candles(symbol, timeframe, start_time=start, limit=limit)
+        if not result[2]:
+            return 0
+        merged = await loop.run_in_executor(None, self.db.bulk_upsert_candles, [result])
+        return merged.get((symbol, timeframe), {}).get("new", 0)
+
     # -------------------------------------------------
     # 2. Основной метод: обновляем ВСЕ таймфреймы
     # -------------------------------------------------
@@ -58,71 +149,177 @@ class DataCollector:
         # Исключаем стейблкоины
         symbols = [s for s in symbols if not any(stable in s for stable in EXCLUDED_STABLES)]
 
-        need_update = []
-        conn = self.db.get_connection()
+        plan = self.plan_refresh(symbols)
+        if not plan:
+            logger.info("✅ Все таймфреймы свежие — загрузка не требуется")
+            return
+
+        # Старшие ряды с курсором внутри окна базы собираются локально
+        now_ms = int(time.time() * 1000)
+        fetch_plan = [p for p in plan if not self._derivable(p[1], p[2], now_ms)]
+        derive_from = {}
+        for sym, tf, start, _ in plan:
+            if self._derivable(tf, start, now_ms):
+                derive_from[sym] = min(start, derive_from.get(sym, start))
+
+        incremental = sum(1 for _, _, start, _ in fetch_plan if start is not None)
+        logger.info(
+            f"📥 К загрузке {len(fetch_plan)} рядов: догрузка {incremental}, полная {len(fetch_plan) - incremental}; "
+            f"сборка из {BASE_TIMEFRAME}: {len(plan) - len(fetch_plan)}"
+        )
+
+        # ---- Загрузка и запись конвейером: ряды пишутся пачками по мере прихода ----
+        loop = asyncio.get_running_loop()
+        writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="candle-writer")
         try:
-            with conn.cursor() as cur:
-                for s in symbols:
-                    for tf, cfg in CANDLE_SETTINGS.items():
-                        cur.execute(
-                            """
-                            SELECT last_updated
-                              FROM collected_candles
-                             WHERE symbol = %s
-                               AND timeframe = %s
-                            """,
-                            (s, tf),
-                        )
-                        row = cur.fetchone()
-                        if (
-                            row is None
-                            or (datetime.now() - row[0]).total_seconds() > cfg["update_freq"]
-                        ):
-                            need_update.append((s, tf))
+            results = await self._fetch_and_store(fetch_plan, writer_pool)
+
+            # ---- Старшие таймфреймы из обновлённой базы ----
+            for sym, tf, first_time in results:
+                if tf == BASE_TIMEFRAME:
+                    derive_from[sym] = min(first_time, derive_from.get(sym, first_time))
+            await loop.run_in_executor(writer_pool, self.derive_timeframes, derive_from)
         finally:
-            self.db.release_connection(conn)
+            writer_pool.shutdown(wait=False)
 
-        if not need_update:
-            logger.info("✅ Все таймфреймы свежие — загрузка не требуется")
-            return
+    async def _fetch_and_store(self, plan, writer_pool):
+        """Загрузчики кладут ряды в ограниченную очередь, писатель сбрасывает её пачками в потоке.
+
+        Загрузчиков не больше BINANCE_MAX_IN_FLIGHT, каждый держит не более
+        одного ряда: когда БД не успевает, put блокируется и загрузка ждёт.
+        Возвращает [(symbol, timeframe, open_time первой свечи)] по непустым рядам.
+        """
+        queue = asyncio.Queue(maxsize=WRITE_QUEUE_SIZE)
+        pending = iter(plan)
+        fetched = []
+
+        async def fetcher():
+            for sym, tf, start, limit in pending:
+                result = await self.fetch_candles(sym, tf, start_time=start, limit=limit)
+                if result[2]:
+                    fetched.append((sym, tf, result[2][0]["time"]))
+                    await queue.put(result)
+
+        async def writer():
+            loop = asyncio.get_running_loop()
+            done = False
+            while not done:
+                batch = [await queue.get()]
+                while len(batch) < WRITE_BATCH_SIZE and not queue.empty():
+                    batch.append(queue.get_nowait())
+                if batch[-1] is None:
+                    batch.pop()
+                    done = True
+                if batch:
+                    await loop.run_in_executor(writer_pool, self.bulk_upsert_candles, batch)
+
+        writer_task = asyncio.create_task(writer())
+        fetchers = [asyncio.create_task(fetcher()) for _ in range(min(BINANCE_MAX_IN_FLIGHT, len(plan)))]
+        finish = None
+        try:
+            # Писатель до сигнала завершения не выходит: если он готов — значит упал,
+            # и загрузчики встали бы на put в неразбираемую очередь навсегда
+            remaining = set(fetchers)
+            while remaining:
+                done, _ = await asyncio.wait({writer_task, *remaining}, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+                remaining -= done
+            finish = asyncio.ensure_future(queue.put(None))
+            await asyncio.wait([finish, writer_task], return_when=asyncio.FIRST_COMPLETED)
+            await writer_task
+        finally:
+            for task in (writer_task, *fetchers, finish):
+                if task is not None:
+                    task.cancel()
+        return fetched
+
+    def derive_timeframes(self, since_by_symbol, timeframes=None):
+        """Пересобирает старшие таймфреймы из BASE_TIMEFRAME с корзины, содержащей since.
+
+        since_by_symbol — {symbol: open_time}; чтение базы начинается с
+        начала самой крупной корзины, чтобы первая свеча собиралась целиком.
+        """
+        timeframes = timeframes or DERIVED_TIMEFRAMES
+        if not since_by_symbol or not timeframes:
+            return {}
+        widest = max(TIMEFRAME_MS[tf] for tf in timeframes)
+        base = self.db.get_candles_since(
+            BASE_TIMEFRAME, {sym: since - since % widest for sym, since in since_by_symbol.items()}
+        )
+        results = [
+            (sym, tf, resample_candles(candles, BASE_TIMEFRAME, tf))
+            for sym, candles in base.items()
+            for tf in timeframes
+        ]
+        results = [r for r in results if r[2]]
+        if not results:
+            return {}
+
+        merged = self.db.bulk_upsert_candles(results)
+        new = sum(counts["new"] for counts in merged.values())
+        logger.info(f"🧮 Собрано из {BASE_TIMEFRAME}: {len(merged)} рядов, новых свечей {new}")
+        return merged
 
-        async with aiohttp.ClientSession(headers={"User-Agent": "Mozilla/5.0"}) as session:
-            tasks = [self.fetch_candles(session, sym, tf) for sym, tf in need_update]
-            results = await asyncio.gather(*tasks)
+    # -------------------------------------------------
+    # 3. Догрузка истории до глубины CANDLE_SETTINGS
+    # -------------------------------------------------
+    async def backfill(self, symbols=None):
+        """Дозаполняет ряды назад по endTime до CANDLE_SETTINGS limit.
+
+        Каждая страница сохраняется сразу, а отправная точка берётся из БД
+        (число свечей и самая старая open_time), поэтому прерванный прогон
+        продолжается с того же места. Ряды качаются параллельно, темп задаёт
+        BinanceScheduler. Возвращает число догруженных свечей.
+        """
+        if symbols is None:
+            symbols = [s for s in self.db.get_symbols_from_cache() if not any(st in s for st in EXCLUDED_STABLES)]
+        depth = self.db.get_series_depth()
+
+        tasks = []
+        for s in symbols:
+            for tf, cfg in CANDLE_SETTINGS.items():
+                count, oldest = depth.get((s, tf), (0, None))
+                if count < cfg["limit"]:
+                    tasks.append(self._backfill_series(s, tf, cfg["limit"] - count, oldest))
+        if not tasks:
+            logger.info("✅ История всех рядов уже на полной глубине")
+            return 0
+
+        logger.info(f"📥 Догрузка истории: {len(tasks)} рядов")
+        start = time.time()
+        loaded = sum(await asyncio.gather(*tasks))
+        logger.info(f"💾 Догружено {loaded} свечей для {len(tasks)} рядов за {time.time() - start:.2f} сек")
+        return loaded
 
-            for symbol, tf, candles in results:
-                if candles:
-                    self.db.upsert_candles(symbol, tf, candles)
-                    logger.info(f"✅ Обновлены свечи: {symbol} {tf} ({len(candles)})")
-        # ---- Сохраняем в БД ----
-        self.bulk_upsert_candles(results)
+    async def _backfill_series(self, symbol, timeframe, missing, oldest):
+        loop = asyncio.get_running_loop()
+        loaded = 0
+        # Пустой ряд начинается с последних свечей, иначе — с бара перед самым старым
+        end_time = oldest - 1 if oldest is not None else None
+        while missing > 0:
+            page = min(missing, KLINES_PAGE_LIMIT)
+            result = await self.fetch_candles(symbol, timeframe, limit=page, end_time=end_time)
+            candles = result[2]
+            if not candles:
+                break
+            merged = await loop.run_in_executor(None, self.db.bulk_upsert_candles, [result])
+            if not merged:
+                break
+            loaded += len(candles)
+            missing -= len(candles)
+            end_time = candles[0]["time"] - 1
+            if len(candles) < page:
+                break  # дошли до начала торгов пары
+        return loaded
 
     # -------------------------------------------------
-    # 3. Массовая вставка/обновление свечей
+    # 4. Массовая вставка/обновление свечей
     # -------------------------------------------------
     def bulk_upsert_candles(self, results):
-        conn = self.db.get_connection()
-        now = datetime.now()
-        try:
-            with conn.cursor() as cur:
-                for symbol, timeframe, candles in results:
-                    if not candles:
-                        continue
-                    cur.execute(
-                        """
-                        INSERT INTO collected_candles (symbol, timeframe, candles, last_updated)
-                        VALUES (%s, %s, %s, %s)
-                        ON CONFLICT (symbol, timeframe)
-                        DO UPDATE
-                            SET candles      = EXCLUDED.candles,
-                                last_updated = EXCLUDED.last_updated
-                        """,
-                        (symbol, timeframe, json.dumps(candles), now),
-                    )
-            conn.commit()
-            logger.info(f"💾 Загружены свечи для {len([r for r in results if r[2]])} комбинаций symbol/timeframe")
-        except Exception as e:
-            logger.error(f"❌ Ошибка сохранения свечей: {e}")
-            conn.rollback()
-        finally:
-            self.db.release_connection(conn)
+        start = time.time()
+        merged = self.db.bulk_upsert_candles(results)
+        for (symbol, tf), counts in merged.items():
+            logger.info(f"✅ Обновлены свечи: {symbol} {tf} (новых {counts['new']}, обновлено {counts['updated']})")
+        logger.info(f"💾 Загружены свечи для {len(merged)} комбинаций symbol/timeframe за {time.time() - start:.2f} сек")
+        return merged
@@ -8,7 +8,7 @@ def get_symbols():
     try:
         conn = db.get_connection()
         with conn.cursor() as cur:
-            cur.execute("SELECT DISTINCT symbol FROM collected_candles")
+            cur.execute("SELECT DISTINCT symbol FROM candle_series")
             return [row[0] for row in cur.fetchall()]
     finally:
         db.release_connection(conn)
@@ -31,30 +31,6 @@ def get_levels(symbol, timeframe):
     return filtered
 
 
-# Добавьте метод для массовой вставки:
-def bulk_upsert_candles(self, data):
-    """Массовая вставка данных"""
-    conn = self.get_connection()
-    try:
-        with conn.cursor() as cur:
-            # Используем COPY для высокой производительности
-            from psycopg2.extras import Json
-            from io import StringIO
-
-            buffer = StringIO()
-            for symbol, timeframe, candles in data:
-                buffer.write(f"{symbol}\t{timeframe}\t{Json(candles)}\n")
-
-            buffer.seek(0)
-            cur.copy_from(buffer, 'collected_candles',
-                          columns=('symbol', 'timeframe', 'candles'),
-                          sep='\t')
-
-            conn.commit()
-    finally:
-        self.release_connection(conn)
-
-
 def get_signals(symbol, timeframe):
     try:
         conn = db.get_connection()
@@ -10,8 +10,9 @@ class FiboEngine:
     def __init__(self):
         self.db = DatabaseManager()
 
-    def calculate_for_pair(self, symbol, timeframe):
-        candles = self.db.get_candles(symbol, timeframe)
+    def calculate_for_pair(self, symbol, timeframe, candles=None):
+        if candles is None:
+            candles = self.db.get_candles(symbol, timeframe)
         if not candles or len(candles) < 50:
             return None
 
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from config.constants import HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, HTTP_DNS_TTL, HTTP_KEEPALIVE
+from services.rate_limiter import BinanceScheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+
+class HttpClient:
+    """Общая на процесс aiohttp-сессия с keep-alive и учётом задержек по хостам.
+
+    Сессия создаётся при первом запросе и пересоздаётся, если сменился
+    event loop (каждый asyncio.run — новый цикл). Сессия закрывается явным
+    close() или при остановке своего цикла. Запросы к Binance идут через
+    BinanceScheduler (binance_json), прочие — через get_json.
+    """
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "_initialized"):
+            return
+        self._initialized = True
+
+        self._session = None
+        self._loop = None
+        self._shutdown_guard = None
+        self.scheduler = BinanceScheduler()
+        self._latency = {}  # host → [count, total_sec, max_sec, errors]
+
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_start(session, ctx, params):
+            ctx.started = time.perf_counter()
+
+        async def on_end(session, ctx, params):
+            self._record(params.url.host, time.perf_counter() - ctx.started)
+
+        async def on_error(session, ctx, params):
+            self._record(params.url.host, time.perf_counter() - ctx.started, error=True)
+
+        trace.on_request_start.append(on_start)
+        trace.on_request_end.append(on_end)
+        trace.on_request_exception.append(on_error)
+        return trace
+
+    def _record(self, host, elapsed, error=False):
+        stat = self._latency.setdefault(host, [0, 0.0, 0.0, 0])
+        stat[0] += 1
+        stat[1] += elapsed
+        stat[2] = max(stat[2], elapsed)
+        if error:
+            stat[3] += 1
+
+    async def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            if self._session is not None and not self._session.closed:
+                # Цикл остановлен не через asyncio.run (shutdown_asyncgens не вызван)
+                logger.warning("⚠️ HTTP-сессия прошлого event loop не была закрыта")
+            self._loop = loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=HTTP_POOL_LIMIT,
+                    limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                    ttl_dns_cache=HTTP_DNS_TTL,
+                    keepalive_timeout=HTTP_KEEPALIVE,
+                ),
+                headers=DEFAULT_HEADERS,
+                trace_configs=[self._trace_config()],
+            )
+            self._shutdown_guard = self._close_on_shutdown(self._session)
+            await self._shutdown_guard.__anext__()
+            logger.debug("✅ HTTP-сессия создана")
+        return self._session
+
+    @staticmethod
+    async def _close_on_shutdown(session):
+        # Генератор висит на yield до остановки цикла: asyncio.run закрывает
+        # незавершённые асинхронные генераторы (shutdown_asyncgens), и сессия
+        # закрывается на своём цикле, а не бросается при смене цикла
+        try:
+            yield
+        finally:
+            if not session.closed:
+                await session.close()
+
+    async def get_json(self, url, params=None, timeout=10):
+        """GET без лимитера. Возвращает (status, json | None)."""
+        session = await self.session()
+        async with session.get(url, params=params, timeout=timeout) as resp:
+            if resp.status != 200:
+                return resp.status, None
+            return resp.status, await resp.json()
+
+    async def binance_json(self, url, params=None, timeout=10, retries=3):
+        """GET к Binance через общий бюджет веса. Возвращает (status, json | None)."""
+        return await self.scheduler.request_json(await self.session(), url, params=params,
+                                                 timeout=timeout, retries=retries)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._shutdown_guard = None
+
+    def stats(self) -> dict:
+        """Задержки запросов по хостам."""
+        return {
+            host: {
+                "count": count,
+                "avg_ms": round(total / count * 1000, 2),
+                "max_ms": round(longest * 1000, 2),
+                "errors": errors,
+            }
+            for host, (count, total, longest, errors) in self._latency.items()
+        }
+
+    def log_stats(self):
+        for host, stat in self.stats().items():
+            logger.info(
+                f"📊 HTTP {host}: запросов {stat['count']}, в среднем {stat['avg_ms']} мс, "
+                f"макс {stat['max_ms']} мс, ошибок {stat['errors']}"
+            )
@@ -1,9 +1,9 @@
-import aiohttp
 import asyncio
 import logging
 from datetime import datetime
 from database.database import DatabaseManager
 from config.constants import BINANCE_TICKER_URL
+from services.http_client import HttpClient
 
 
 logger = logging.getLogger(__name__)
@@ -11,19 +11,18 @@ logger = logging.getLogger(__name__)
 class PairIdentifier:
     def __init__(self):
         self.db = DatabaseManager()
+        self.http = HttpClient()
 
     async def fetch_all_usdt_pairs(self):
         try:
-            async with aiohttp.ClientSession(headers={"User-Agent": "Mozilla/5.0"}) as session:
-                async with session.get(BINANCE_TICKER_URL, timeout=10) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        pairs = [item["symbol"] for item in data if item["symbol"].endswith("USDT")]
-                        logger.info(f"📥 Получено {len(pairs)} USDT-пар с Binance")
-                        return pairs
-                    else:
-                        logger.error(f"❌ Binance API error: {resp.status}")
-                        return []
+            status, data = await self.http.binance_json(BINANCE_TICKER_URL, timeout=10)
+            if status == 200:
+                pairs = [item["symbol"] for item in data if item["symbol"].endswith("USDT")]
+                logger.info(f"📥 Получено {len(pairs)} USDT-пар с Binance")
+                return pairs
+            else:
+                logger.error(f"❌ Binance API error: {status}")
+                return []
         except Exception as e:
             logger.error(f"❌ Ошибка получения пар с Binance: {e}")
             return []
@@ -1,11 +1,14 @@
 import logging
+import time
 from datetime import datetime
 
 
 import numpy as np
-import pandas as pd
 
+from config.constants import CANDLE_SETTINGS, TIMEFRAME_MS
 from database.database import DatabaseManager
+from services import batch_indicators
+from services.indicator_state import IndicatorState
 
 logger = logging.getLogger(__name__)
 
@@ -15,139 +18,88 @@ class IndicatorEngine:
         self.db = DatabaseManager()
 
     def compute_indicators(self):
-        """Вычисляет и сохраняет полный набор индикаторов для каждой пары-таймфрейма."""
+        """Вычисляет и сохраняет полный набор индикаторов для каждой пары-таймфрейма.
+
+        Ряды одного таймфрейма считаются вместе — матрицами symbols × bars
+        (services/batch_indicators), без DataFrame на каждый ряд.
+        """
         all_candles = self.db.get_all_candles()
         indicators: list[dict] = []
 
-
-        for (symbol, tf), candles in all_candles.items():
-            # Нужна хотя бы 200-дневная история для EMA-200
-            if len(candles) < 200:
-                continue
-
-            df = pd.DataFrame(candles)
-            df["close"] = pd.to_numeric(df["close"])
-            df["high"] = pd.to_numeric(df["high"])
-            df["low"] = pd.to_numeric(df["low"])
-
-            # ── базовые расчёты ───────────────────────────────────────────────────
-            rsi = self._rsi(df["close"])
-            macd_line, macd_sig, _ = self._macd(df["close"])
-            macd_hist = macd_line - macd_sig  # ← добавь эту строку
-            ema20 = df["close"].ewm(span=20, adjust=False).mean()
-            ema50 = df["close"].ewm(span=50, adjust=False).mean()
-            ema200 = df["close"].ewm(span=200, adjust=False).mean()
-            bb_up, bb_mid, bb_lo = self._bollinger_bands(df["close"])
-            stoch_k, stoch_d = self._stochastic(df)
-
-            # ── объём / ликвидность ───────────────────────────────
-            obv = self._obv(df["close"], df["volume"])
-            vwap = self._vwap(df)  # 20-периодная
-            poc = self._vpvr_poc(df)  # VPVR POC за N свечей
-
-            # ── сила тренда и волатильность ───────────────────────
-            atr = self._atr(df)  # 14-p ATR
-            adx = self._adx(df)  # 14-p ADX
-
-            # ── super-trend (по ATR) ──────────────────────────────
-            supertrend = self._supertrend(df, atr)
-
-
-            # # === Индикаторы ===
-            # rsi = self._rsi(df)
-            # macd_line, macd_sig, macd = self._macd(df)
-            # ema20 = self._ema(df, 20)
-            # ema50 = self._ema(df, 50)
-            # ema200 = self._ema(df, 200)
-            # bb_up, bb_mid, bb_lo = self._bollinger_bands(df["close"])
-            # stoch_k, stoch_d = self._stochastic(df)
-            # obv = self._obv(df["close"], df["volume"])
-            # vwap = self._vwap(df)
-            # poc = self._vpvr_poc(df)
-            # atr = self._atr(df)
-            # adx = self._adx(df)
-            # supertrend = self._supertrend(df, atr)
-
-            last_close = df["close"].iloc[-1]
-            recommendation = self._recommend(
-                last_close=last_close,
-                ema20=ema20.iloc[-1],
-                rsi_val=rsi.iloc[-1],
-                macd_val=macd_line.iloc[-1],
-                macd_sig=macd_sig.iloc[-1],
-                macd_hist=macd_hist.iloc[-1],  # ← добавь эту строку
-                bb_middle=bb_mid.iloc[-1]
-            )
-
-            indicators.append(dict(
-                symbol=symbol,
-                timeframe=tf,
-                rsi=rsi.iloc[-1],
-                macd=macd_hist.iloc[-1],  # можно оставить старое имя macd
-                macd_hist=macd_hist.iloc[-1],  # ← добавь эту строку
-                ema20=ema20.iloc[-1],
-                ema50=ema50.iloc[-1],
-                ema200=ema200.iloc[-1],
-                bb_upper=bb_up.iloc[-1],
-                bb_lower=bb_lo.iloc[-1],
-                stoch_k=stoch_k.iloc[-1],
-                stoch_d=stoch_d.iloc[-1],
-                obv=obv.iloc[-1],
-                vwap=vwap.iloc[-1],
-                poc=poc if not hasattr(poc, "iloc") else float(poc.iloc[-1]),
-                atr=atr.iloc[-1],
-                adx=adx.iloc[-1],
-                supertrend=supertrend.iloc[-1],
-                recommendation=recommendation,
-            ))
-
-            indicators_to_save = [
-                {"type": "RSI", "value": rsi.iloc[-1]},
-                {"type": "MACD", "value": macd_hist.iloc[-1]},
-                {"type": "EMA50", "value": ema50.iloc[-1]},
-                {"type": "EMA200", "value": ema200.iloc[-1]},
-                {"type": "BB_UPPER", "value": bb_up.iloc[-1]},
-                {"type": "BB_LOWER", "value": bb_lo.iloc[-1]},
-                {"type": "STOCH_K", "value": stoch_k.iloc[-1]},
-                {"type": "STOCH_D", "value": stoch_d.iloc[-1]},
-                {"type": "ATR", "value": atr.iloc[-1]},
-                {"type": "ADX", "value": adx.iloc[-1]},
-                {"type": "VWAP", "value": vwap.iloc[-1]},
-                {"type": "POC", "value": poc if not hasattr(poc, "iloc") else float(poc.iloc[-1])}
-            ]
-
-
-
+        for tf, group in batch_indicators.group_by_timeframe(all_candles).items():
+            keys, arrays = batch_indicators.pack_candles(group)
+            indicators.extend(self.compute_batch(tf, keys, batch_indicators.IndicatorContext(arrays)))
 
         self._save_indicators(indicators)
         return indicators
 
-    def _ema(self, df, period):
-        return df["close"].ewm(span=period, adjust=False).mean()
-
-    def _rsi(self, series, period=14):
-        delta = series.diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        avg_gain = gain.rolling(window=period).mean()
-        avg_loss = loss.rolling(window=period).mean()
-        rs = avg_gain / avg_loss
-        return 100 - (100 / (1 + rs))
+    def compute_batch(self, tf, keys, context):
+        """Записи indicators для рядов одного таймфрейма из IndicatorContext (без обращения к БД)."""
+        # Нужна хотя бы 200-свечная история для EMA-200
+        rows = np.flatnonzero(context.lengths >= 200)
+        return [
+            self._record_from_values(keys[row][0], tf, values)
+            for row, values in zip(rows, batch_indicators.indicator_snapshot(context, rows))
+        ]
 
-    def _macd(self, series, fast=12, slow=26, signal=9):
-        ema_fast = series.ewm(span=fast, adjust=False).mean()
-        ema_slow = series.ewm(span=slow, adjust=False).mean()
-        macd_line = ema_fast - ema_slow
-        signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-        macd_hist = macd_line - signal_line
-        return macd_line, signal_line, macd_hist
+    def compute_single(self, symbol, timeframe):
+        """Обновляет и сохраняет индикаторы одного ряда по его состоянию.
 
-    def _bollinger_bands(self, series, period=20):
-        middle = series.rolling(window=period).mean()
-        std = series.rolling(window=period).std()
-        upper = middle + 2 * std
-        lower = middle - 2 * std
-        return upper, middle, lower
+        Сохранённое состояние продвигается только закрытыми свечами после
+        last_time, незакрытая учитывается в значениях без записи в состояние.
+        Без состояния или при разрыве в свечах — прогрев по всей истории ряда.
+        """
+        tf_ms = TIMEFRAME_MS[timeframe]
+        now_ms = time.time() * 1000
+
+        state, candles = None, []
+        saved = self.db.get_indicator_state(symbol, timeframe)
+        if saved:
+            last_time, data = saved
+            candles = self.db.get_candles_since(timeframe, {symbol: last_time + 1}).get(symbol, [])
+            if not candles or candles[0]["time"] == last_time + tf_ms:
+                state = IndicatorState.from_dict(data)
+        if state is None:
+            state = IndicatorState(poc_window=CANDLE_SETTINGS.get(timeframe, {}).get("limit", 500))
+            candles = self.db.get_candles(symbol, timeframe)
+
+        closed = [c for c in candles if c["time"] + tf_ms <= now_ms]
+        live = candles[len(closed):]
+        for candle in closed:
+            state.update(candle)
+        if closed:
+            self.db.save_indicator_state(symbol, timeframe, state.last_time, state.to_dict())
+
+        # Нужна хотя бы 200-свечная история для EMA-200
+        if state.count + len(live) < 200:
+            return None
+
+        values = state.preview(live[-1]) if live else state.values()
+        record = self._record_from_values(symbol, timeframe, values)
+        self._save_indicators([record])
+        return record
+
+    def _record_from_values(self, symbol, tf, values):
+        """Запись indicators из значений IndicatorState — те же поля, что у полного пересчёта."""
+        recommendation = self._recommend(
+            last_close=values["last_close"],
+            ema20=values["ema20"],
+            rsi_val=values["rsi"],
+            macd_val=values["macd_line"],
+            macd_sig=values["macd_signal"],
+            macd_hist=values["macd_hist"],
+            bb_middle=values["bb_middle"]
+        )
+        return dict(
+            symbol=symbol,
+            timeframe=tf,
+            macd=values["macd_hist"],
+            recommendation=recommendation,
+            **{key: values[key] for key in (
+                "rsi", "macd_hist", "ema20", "ema50", "ema200", "bb_upper", "bb_lower", "stoch_k",
+                "stoch_d", "obv", "vwap", "poc", "atr", "adx", "supertrend",
+            )},
+        )
 
     def _recommend(
             self,
@@ -169,105 +121,24 @@ class IndicatorEngine:
             return "ПРОДАВАТЬ"
         return "НАБЛЮДАТЬ"
 
-    def _stochastic(self, df, k_period=14, d_period=3):
-        low_min = df["low"].rolling(window=k_period).min()
-        high_max = df["high"].rolling(window=k_period).max()
-        k = 100 * (df["close"] - low_min) / (high_max - low_min)
-        d = k.rolling(window=d_period).mean()
-        return k, d
-
-    def _obv(self, close, volume):
-        direction = np.sign(close.diff().fillna(0))
-        return (volume * direction).cumsum()
-
-    def _vwap(self, df, period=20):
-        pv = (df["high"] + df["low"] + df["close"]) / 3 * df["volume"]
-        return pv.rolling(period).sum() / df["volume"].rolling(period).sum()
-
-    def _vpvr_poc(self, df, bins=24):
-        hist, edges = np.histogram(df["close"], bins=bins, weights=df["volume"])
-        idx = hist.argmax()
-        return (edges[idx] + edges[idx + 1]) / 2
-
-    def _atr(self, df, period=14):
-        tr = pd.concat([
-            df["high"] - df["low"],
-            (df["high"] - df["close"].shift()).abs(),
-            (df["low"] - df["close"].shift()).abs()
-        ], axis=1).max(axis=1)
-        return tr.rolling(period).mean()
-
-    def _adx(self, df, period=14):
-        up = df["high"].diff()
-        dn = -df["low"].diff()
-        plus_dm = np.where((up > dn) & (up > 0), up, 0.0)
-        minus_dm = np.where((dn > up) & (dn > 0), dn, 0.0)
-        tr = self._atr(df, 1)  # true range дневной
-        plus_di = 100 * pd.Series(plus_dm).ewm(span=period).mean() / tr
-        minus_di = 100 * pd.Series(minus_dm).ewm(span=period).mean() / tr
-        dx = (abs(plus_di - minus_di) / (plus_di + minus_di)).fillna(0) * 100
-        return dx.ewm(span=period).mean()
-
-    def _supertrend(self, df, atr, factor=3):
-        hl2 = (df["high"] + df["low"]) / 2
-        upper = hl2 + factor * atr
-        lower = hl2 - factor * atr
-        trend = pd.Series(index=df.index, dtype=bool)
-        trend.iloc[0] = True
-        for i in range(1, len(df)):
-            if df["close"].iloc[i] > upper.iloc[i - 1]:
-                trend.iloc[i] = True
-            elif df["close"].iloc[i] < lower.iloc[i - 1]:
-                trend.iloc[i] = False
-            else:
-                trend.iloc[i] = trend.iloc[i - 1]
-                upper.iloc[i] = min(upper.iloc[i], upper.iloc[i - 1]) if trend.iloc[i] else upper.iloc[i]
-                lower.iloc[i] = max(lower.iloc[i], lower.iloc[i - 1]) if not trend.iloc[i] else lower.iloc[i]
-        return trend
-
     def _save_indicators(self, records: list[dict]):
-        """Сохраняет рассчитанные индикаторы в таблицу `indicators`."""
+        """Сохраняет рассчитанные индикаторы в таблицу `indicators` одним пакетом."""
         if not records:
             return
 
-        import numpy as np  # нужен для проверки np.floating
-
-        conn = self.db.get_connection()
-        insert_sql = """
-            INSERT INTO indicators (symbol, timeframe, indicator_type, value, created_at)
-            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
-            ON CONFLICT (symbol, timeframe, indicator_type)
-            DO UPDATE SET value = EXCLUDED.value,
-                          created_at = EXCLUDED.created_at;
-        """
-
         names = [
             "RSI", "MACD", "MACD_HIST", "EMA20", "EMA50", "EMA200",
             "BB_UPPER", "BB_LOWER", "STOCH_K", "STOCH_D", "RECOMMENDATION", "OBV", "VWAP", "VPVR_POC", "ATR", "ADX", "SUPERTREND"
         ]
 
-        try:
-            with conn.cursor() as cur:
-                for rec in records:
-                    for name in names:
-                        key = "recommendation" if name == "RECOMMENDATION" else name.lower()
-                        val = rec.get(key)
-                        if val is None:
-                            continue
-
-                        # numpy → float | строка → str
-                        if isinstance(val, (float, int, np.floating)):
-                            val_db = float(val)
-                        else:
-                            val_db = str(val)
-
-                        cur.execute(
-                            insert_sql,
-                            (rec["symbol"], rec["timeframe"], name, val_db)
-                        )
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"❌ Ошибка сохранения индикаторов: {e}", exc_info=True)
-        finally:
-            self.db.release_connection(conn)
+        rows = []
+        for rec in records:
+            for name in names:
+                # VPVR_POC в записи движка — "poc"
+                key = "poc" if name == "VPVR_POC" else name.lower()
+                val = rec.get(key)
+                if val is None:
+                    continue
+                rows.append((rec["symbol"], rec["timeframe"], name, val))
+
+        self.db.save_indicator_values(rows, source="indicators")
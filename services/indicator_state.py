@@ -0,0 +1,245 @@
+import copy
+import math
+from collections import deque
+
+import numpy as np
+
+NAN = float("nan")
+
+# Окна и периоды — те же, что у полного пересчёта в IndicatorEngine
+RSI_PERIOD = 14
+BB_PERIOD = 20
+STOCH_K = 14
+STOCH_D = 3
+VWAP_PERIOD = 20
+ATR_PERIOD = 14
+ADX_SPAN = 14
+SUPERTREND_FACTOR = 3
+POC_BINS = 24
+
+
+def _alpha(span):
+    return 2 / (span + 1)
+
+
+def _div(a, b):
+    # Деление с семантикой pandas/numpy: x/0 → ±inf, 0/0 → nan, без исключений
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.float64(a) / np.float64(b))
+
+
+def _mean(window, size):
+    return sum(window) / size if len(window) == size else NAN
+
+
+class IndicatorState:
+    """Рекуррентное состояние индикаторов одного ряда.
+
+    update(candle) продвигает состояние на одну закрытую свечу за O(окна),
+    values() отдаёт значения на последней свече. EMA/MACD (adjust=False),
+    ewm ADX (adjust=True, через числитель и знаменатель), OBV и SuperTrend
+    хранятся как накопленные величины, скользящие средние RSI/ATR/BB/VWAP/
+    Stochastic — как окна фиксированной длины. VPVR POC считается по окну
+    последних poc_window свечей (глубина хранимого ряда).
+
+    Незакрытая свеча не меняет состояние: preview(candle) считает значения
+    на копии.
+    """
+
+    FIELDS = (
+        "count", "last_time", "prev_close", "prev_high", "prev_low",
+        "ema12", "ema20", "ema26", "ema50", "ema200", "macd_signal", "obv",
+        "pdm_num", "mdm_num", "dx_num", "ew_den", "dx",
+        "st_upper", "st_lower", "st_trend", "stoch_k", "poc_window",
+    )
+    WINDOWS = {
+        "gains": RSI_PERIOD, "losses": RSI_PERIOD, "closes": BB_PERIOD,
+        "highs": STOCH_K, "lows": STOCH_K, "k_values": STOCH_D,
+        "pv": VWAP_PERIOD, "vol": VWAP_PERIOD, "tr": ATR_PERIOD,
+    }
+
+    def __init__(self, poc_window=500):
+        self.count = 0
+        self.last_time = None
+        self.prev_close = self.prev_high = self.prev_low = None
+        self.ema12 = self.ema20 = self.ema26 = self.ema50 = self.ema200 = None
+        self.macd_signal = None
+        self.obv = 0.0
+        self.pdm_num = self.mdm_num = self.dx_num = self.ew_den = 0.0
+        self.dx = NAN
+        self.st_upper = self.st_lower = NAN
+        self.st_trend = True
+        self.stoch_k = NAN
+        self.poc_window = poc_window
+        for name, size in self.WINDOWS.items():
+            setattr(self, name, deque(maxlen=size))
+        self.poc = deque(maxlen=poc_window)
+
+    # -------------------------------------------------
+    # Шаг по закрытой свече
+    # -------------------------------------------------
+    def update(self, candle):
+        high, low, close = float(candle["high"]), float(candle["low"]), float(candle["close"])
+        volume = float(candle["volume"])
+        first = self.count == 0
+
+        # EMA и MACD: y = y_prev + α·(x − y_prev), первая точка — сама цена
+        for span in (12, 20, 26, 50, 200):
+            name = f"ema{span}"
+            prev = getattr(self, name)
+            setattr(self, name, close if prev is None else prev + _alpha(span) * (close - prev))
+        macd_line = self.ema12 - self.ema26
+        self.macd_signal = macd_line if self.macd_signal is None else (
+            self.macd_signal + _alpha(9) * (macd_line - self.macd_signal)
+        )
+
+        # RSI: скользящие средние роста/падения (первая разность — 0)
+        delta = NAN if first else close - self.prev_close
+        self.gains.append(delta if delta > 0 else 0.0)
+        self.losses.append(-delta if delta < 0 else -0.0)
+
+        # OBV
+        if not first:
+            self.obv += volume * (1.0 if delta > 0 else -1.0 if delta < 0 else 0.0)
+
+        self.closes.append(close)
+        self.highs.append(high)
+        self.lows.append(low)
+        self.pv.append((high + low + close) / 3 * volume)
+        self.vol.append(volume)
+
+        # Stochastic %K на этой свече
+        if len(self.highs) == STOCH_K:
+            low_min, high_max = min(self.lows), max(self.highs)
+            self.stoch_k = _div(100 * (close - low_min), high_max - low_min)
+        else:
+            self.stoch_k = NAN
+        self.k_values.append(self.stoch_k)
+
+        # True range (на первой свече — high − low)
+        if first:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.tr.append(tr)
+
+        # ADX: ewm(adjust=True) = Σ(1−α)^k·x / Σ(1−α)^k
+        decay = 1 - _alpha(ADX_SPAN)
+        up = NAN if first else high - self.prev_high
+        dn = NAN if first else self.prev_low - low
+        plus_dm = up if (up > dn and up > 0) else 0.0
+        minus_dm = dn if (dn > up and dn > 0) else 0.0
+        self.pdm_num = plus_dm + decay * self.pdm_num
+        self.mdm_num = minus_dm + decay * self.mdm_num
+        self.ew_den = 1.0 + decay * self.ew_den
+        plus_di = _div(100 * (self.pdm_num / self.ew_den), tr)
+        minus_di = _div(100 * (self.mdm_num / self.ew_den), tr)
+        dx = _div(abs(plus_di - minus_di), plus_di + minus_di)
+        dx = 0.0 if math.isnan(dx) else dx * 100
+        self.dx_num = dx + decay * self.dx_num
+        self.dx = self.dx_num / self.ew_den
+
+        # SuperTrend по ATR этой свечи и итоговым полосам прошлой
+        atr = _mean(self.tr, ATR_PERIOD)
+        hl2 = (high + low) / 2
+        upper, lower = hl2 + SUPERTREND_FACTOR * atr, hl2 - SUPERTREND_FACTOR * atr
+        if not first:
+            if close > self.st_upper:
+                self.st_trend = True
+            elif close < self.st_lower:
+                self.st_trend = False
+            elif self.st_trend:
+                if self.st_upper < upper:
+                    upper = self.st_upper
+            elif self.st_lower > lower:
+                lower = self.st_lower
+        self.st_upper, self.st_lower = upper, lower
+
+        self.poc.append((close, volume))
+        self.prev_close, self.prev_high, self.prev_low = close, high, low
+        self.last_time = int(candle["time"])
+        self.count += 1
+
+    def preview(self, candle):
+        """Значения с учётом незакрытой свечи, без изменения состояния."""
+        state = copy.deepcopy(self)
+        state.update(candle)
+        return state.values()
+
+    # -------------------------------------------------
+    # Значения на последней свече
+    # -------------------------------------------------
+    def values(self) -> dict:
+        rs = _div(_mean(self.gains, RSI_PERIOD), _mean(self.losses, RSI_PERIOD))
+        rsi = 100 - _div(100, 1 + rs)
+
+        bb_mid = _mean(self.closes, BB_PERIOD)
+        if len(self.closes) == BB_PERIOD:
+            std = math.sqrt(sum((c - bb_mid) ** 2 for c in self.closes) / (BB_PERIOD - 1))
+        else:
+            std = NAN
+
+        macd_line = self.ema12 - self.ema26
+        k_values = list(self.k_values)
+        stoch_d = NAN if len(k_values) < STOCH_D or any(math.isnan(k) for k in k_values) else sum(k_values) / STOCH_D
+
+        vwap = _div(sum(self.pv), sum(self.vol)) if len(self.pv) == VWAP_PERIOD else NAN
+
+        closes, volumes = zip(*self.poc)
+        hist, edges = np.histogram(closes, bins=POC_BINS, weights=volumes)
+        idx = hist.argmax()
+
+        return {
+            "last_close": self.prev_close,
+            "rsi": rsi,
+            "macd_line": macd_line,
+            "macd_signal": self.macd_signal,
+            "macd_hist": macd_line - self.macd_signal,
+            "ema20": self.ema20,
+            "ema50": self.ema50,
+            "ema200": self.ema200,
+            "bb_upper": bb_mid + 2 * std,
+            "bb_middle": bb_mid,
+            "bb_lower": bb_mid - 2 * std,
+            "stoch_k": self.stoch_k,
+            "stoch_d": stoch_d,
+            "obv": self.obv,
+            "vwap": vwap,
+            "poc": float((edges[idx] + edges[idx + 1]) / 2),
+            "atr": _mean(self.tr, ATR_PERIOD),
+            "adx": self.dx,
+            "supertrend": self.st_trend,
+        }
+
+    # -------------------------------------------------
+    # Сериализация в JSONB (NaN → null)
+    # -------------------------------------------------
+    def to_dict(self) -> dict:
+        def clean(value):
+            if isinstance(value, float) and math.isnan(value):
+                return None
+            if isinstance(value, (list, tuple)):
+                return [clean(v) for v in value]
+            return value
+
+        data = {name: clean(getattr(self, name)) for name in self.FIELDS}
+        data.update({name: clean(list(getattr(self, name))) for name in self.WINDOWS})
+        data["poc"] = [list(item) for item in self.poc]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndicatorState":
+        def restore(value):
+            return NAN if value is None else value
+
+        state = cls(poc_window=data["poc_window"])
+        for name in cls.FIELDS:
+            value = data[name]
+            if name in ("last_time", "prev_close", "prev_high", "prev_low", "macd_signal") or name.startswith("ema"):
+                setattr(state, name, value)
+            else:
+                setattr(state, name, restore(value))
+        for name, size in cls.WINDOWS.items():
+            setattr(state, name, deque((restore(v) for v in data[name]), maxlen=size))
+        state.poc = deque((tuple(item) for item in data["poc"]), maxlen=state.poc_window)
+        return state
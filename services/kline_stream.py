@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from config.constants import BINANCE_WS_URL, KLINE_STREAMS_PER_CONNECTION
+from database.database import DatabaseManager
+from services.collector import DataCollector
+from services.http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_MAX_DELAY = 60
+STATS_INTERVAL = 60
+
+
+class KlineStream:
+    """Приём свечей из combined kline-потоков Binance в хранилище candles.
+
+    Потоки symbol@kline_tf делятся на соединения по KLINE_STREAMS_PER_CONNECTION.
+    Закрытые свечи пишутся пачкой каждые flush_interval сек, незакрытые —
+    не чаще live_flush_interval (последнее состояние на ряд). После каждого
+    (пере)подключения ряды соединения догружаются по REST от курсора
+    в БД, чтобы закрыть разрыв за время простоя.
+
+    on_closed — необязательный async-callback со списком (symbol, timeframe),
+    по которым сохранены закрытые свечи (из потока или догрузки). Вызывается
+    в отдельной задаче, не задерживая запись: пока callback работает, новые
+    ряды копятся в множестве и уходят следующим вызовом одной пачкой.
+    """
+
+    def __init__(self, symbols, timeframes, on_closed=None, flush_interval=0.5, live_flush_interval=5.0):
+        self.db = DatabaseManager()
+        self.http = HttpClient()
+        self.collector = DataCollector()
+        self.on_closed = on_closed
+        self.flush_interval = flush_interval
+        self.live_flush_interval = live_flush_interval
+
+        self.streams = [f"{s.lower()}@kline_{tf}" for s in symbols for tf in timeframes]
+        self._closed = {}  # (symbol, tf) → {open_time: candle}
+        self._close_times = {}  # (symbol, tf, open_time) → время закрытия свечи, мс
+        self._live = {}  # (symbol, tf) → последняя незакрытая свеча
+        self._last_live_flush = 0.0
+        self._notify_pending = set()  # (symbol, tf), ждущие on_closed
+        self._notify_task = None
+
+        self._messages = 0
+        self._stored_closed = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+        self._reconnects = 0
+
+    async def run(self):
+        chunks = [
+            self.streams[i:i + KLINE_STREAMS_PER_CONNECTION]
+            for i in range(0, len(self.streams), KLINE_STREAMS_PER_CONNECTION)
+        ]
+        logger.info(f"📡 Подписка на {len(self.streams)} kline-потоков в {len(chunks)} соединениях")
+        try:
+            await asyncio.gather(self._flush_loop(), *[self._connection(n, chunk) for n, chunk in enumerate(chunks)])
+        finally:
+            if self._notify_task is not None and not self._notify_task.done():
+                self._notify_task.cancel()
+
+    # -------------------------------------------------
+    # Соединения
+    # -------------------------------------------------
+    async def _connection(self, n, streams):
+        url = f"{BINANCE_WS_URL}/stream?streams={'/'.join(streams)}"
+        delay = 1
+        while True:
+            backfill = None
+            try:
+                session = await self.http.session()
+                async with session.ws_connect(url, autoping=True, max_msg_size=0) as ws:
+                    logger.info(f"🔌 Соединение #{n}: {len(streams)} потоков")
+                    delay = 1
+                    backfill = asyncio.create_task(self._backfill(streams))
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            self._on_message(msg.json())
+                        elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Соединение #{n}: {e}")
+            finally:
+                if backfill is not None and not backfill.done():
+                    backfill.cancel()
+
+            self._reconnects += 1
+            logger.warning(f"🔌 Соединение #{n} потеряно, переподключение через {delay} сек")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _backfill(self, streams):
+        """Догружает по REST ряды соединения от последней сохранённой свечи."""
+        loop = asyncio.get_running_loop()
+        state = await loop.run_in_executor(None, self.db.get_series_state)
+        now_ms = int(time.time() * 1000)
+
+        tasks = []
+        for stream in streams:
+            symbol, tf = stream.split("@kline_")
+            symbol = symbol.upper()
+            series = state.get((symbol, tf))
+            start, limit = DataCollector._fetch_window(tf, series["last_open_time"] if series else None, now_ms)
+            tasks.append(self.collector.fetch_candles(symbol, tf, start_time=start, limit=limit))
+        results = await asyncio.gather(*tasks)
+
+        merged = await loop.run_in_executor(None, self.db.bulk_upsert_candles, results)
+        new = sum(counts["new"] for counts in merged.values())
+        logger.info(f"📥 Догрузка после подключения: {len(merged)} рядов, новых свечей {new}")
+        self._notify(list(merged))
+
+    # -------------------------------------------------
+    # Буфер свечей
+    # -------------------------------------------------
+    def _on_message(self, payload):
+        data = payload.get("data", payload)
+        if data.get("e") != "kline":
+            return
+        self._messages += 1
+        k = data["k"]
+        key = (data["s"], k["i"])
+        candle = {
+            "time": int(k["t"]),
+            "open": float(k["o"]),
+            "high": float(k["h"]),
+            "low": float(k["l"]),
+            "close": float(k["c"]),
+            "volume": float(k["v"]),
+        }
+        if k["x"]:
+            self._closed.setdefault(key, {})[candle["time"]] = candle
+            self._close_times[(*key, candle["time"])] = int(k["T"])
+            live = self._live.get(key)
+            if live and live["time"] <= candle["time"]:
+                del self._live[key]
+        else:
+            self._live[key] = candle
+
+    def _take_batch(self):
+        batch = {key: dict(bars) for key, bars in self._closed.items()}
+        self._closed.clear()
+        closed_keys = list(batch)
+
+        now = time.monotonic()
+        if self._live and now - self._last_live_flush >= self.live_flush_interval:
+            for key, candle in self._live.items():
+                batch.setdefault(key, {}).setdefault(candle["time"], candle)
+            self._live.clear()
+            self._last_live_flush = now
+        return batch, closed_keys
+
+    async def flush(self):
+        batch, closed_keys = self._take_batch()
+        if not batch:
+            return
+
+        results = [
+            (symbol, tf, sorted(bars.values(), key=lambda c: c["time"]))
+            for (symbol, tf), bars in batch.items()
+        ]
+        loop = asyncio.get_running_loop()
+        merged = await loop.run_in_executor(None, self.db.bulk_upsert_candles, results)
+        if not merged:
+            # Ошибка записи: закрытые свечи вернутся в буфер до следующей попытки
+            for key in closed_keys:
+                pending = self._closed.setdefault(key, {})
+                for open_time, candle in batch[key].items():
+                    if (*key, open_time) in self._close_times:
+                        pending.setdefault(open_time, candle)
+            return
+
+        now_ms = time.time() * 1000
+        for key in closed_keys:
+            for open_time in batch[key]:
+                close_time = self._close_times.pop((*key, open_time), None)
+                if close_time is None:
+                    continue
+                lag = max(0.0, (now_ms - close_time) / 1000)
+                self._stored_closed += 1
+                self._lag_total += lag
+                self._lag_max = max(self._lag_max, lag)
+
+        self._notify(closed_keys)
+
+    # -------------------------------------------------
+    # Callback закрытых свечей
+    # -------------------------------------------------
+    def _notify(self, keys):
+        if self.on_closed is None or not keys:
+            return
+        self._notify_pending.update(keys)
+        if self._notify_task is None or self._notify_task.done():
+            self._notify_task = asyncio.create_task(self._drain_notify())
+
+    async def _drain_notify(self):
+        while self._notify_pending:
+            series = sorted(self._notify_pending)
+            self._notify_pending.clear()
+            try:
+                await self.on_closed(series)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработки закрытых свечей: {e}")
+
+    async def _flush_loop(self):
+        last_stats = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Ошибка записи свечей из потока: {e}")
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                self.log_stats()
+                last_stats = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "messages": self._messages,
+            "stored_closed": self._stored_closed,
+            "lag_avg_sec": round(self._lag_total / self._stored_closed, 3) if self._stored_closed else None,
+            "lag_max_sec": round(self._lag_max, 3),
+            "reconnects": self._reconnects,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"📊 Поток свечей: сообщений {stats['messages']}, закрытых свечей сохранено {stats['stored_closed']}, "
+            f"задержка закрытие→БД в среднем {stats['lag_avg_sec']} сек (макс {stats['lag_max_sec']} сек), "
+            f"переподключений {stats['reconnects']}"
+        )
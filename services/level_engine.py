@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 
 from database.database import DatabaseManager
+from services import batch_indicators
 
 logger = logging.getLogger(__name__)
 
@@ -22,18 +23,35 @@ class LevelAnalyzer:
         all_candles = self.db.get_all_candles()
         levels = []
 
-        for (symbol, tf), candles in all_candles.items():
-            if tf not in self.configs or len(candles) < 100:
-                continue
+        for tf, group in batch_indicators.group_by_timeframe(all_candles).items():
+            keys, arrays = batch_indicators.pack_candles(group)
+            levels.extend(self.compute_batch(tf, keys, batch_indicators.IndicatorContext(arrays)))
+
+        merged = self._merge_levels(levels)
+        self.db.save_levels(merged)
+        return merged
 
-            df = pd.DataFrame(candles)
-            df["close"] = pd.to_numeric(df["close"])
-            df["high"] = pd.to_numeric(df["high"])
-            df["low"] = pd.to_numeric(df["low"])
+    def compute_batch(self, tf, keys, context):
+        """Уровни рядов одного таймфрейма из IndicatorContext (до _merge_levels, без обращения к БД)."""
+        if tf not in self.configs:
+            return []
+        cfg = self.configs[tf]
+        lengths = context.lengths
+        rows = np.flatnonzero(lengths >= 100)
+        if not len(rows):
+            return []
+
+        # Пивоты по всем рядам таймфрейма одной матрицей, EMA-уровни — из общего контекста
+        close = context["close"]
+        ph, pl = batch_indicators.pivots(context["high"], context["low"], cfg["pivot_period"])
+        ema50, ema200 = context.last("ema50"), context.last("ema200")
 
-            cfg = self.configs[tf]
-            df = self._detect_pivots(df, cfg["pivot_period"])
-            channels = self._cluster_levels(df, cfg)
+        levels = []
+        for row in rows:
+            symbol = keys[row][0]
+            n = lengths[row]
+            df = pd.DataFrame({"close": close[row, -n:], "ph": ph[row, -n:], "pl": pl[row, -n:]})
+            channels = self._cluster_levels(df, cfg, {50: ema50[row], 200: ema200[row]})
 
             for ch in channels:
                 levels.append({
@@ -49,19 +67,9 @@ class LevelAnalyzer:
                     "broken": False,
                     "last_touched": datetime.now().timestamp()
                 })
+        return levels
 
-        merged = self._merge_levels(levels)
-        self.db.save_levels(merged)
-        return merged
-
-    def _detect_pivots(self, df, period):
-        df["ph"] = df["high"].rolling(window=2 * period + 1, center=True).apply(
-            lambda x: x[period] if x[period] == x.max() else np.nan, raw=True)
-        df["pl"] = df["low"].rolling(window=2 * period + 1, center=True).apply(
-            lambda x: x[period] if x[period] == x.min() else np.nan, raw=True)
-        return df
-
-    def _cluster_levels(self, df, cfg):
+    def _cluster_levels(self, df, cfg, ema_levels=None):
         points = []
         for i, row in df.iterrows():
             if not np.isnan(row["ph"]):
@@ -97,7 +105,10 @@ class LevelAnalyzer:
         # EMA уровни (если достаточно свечей)
         if len(df) >= 200:
             for span, label in [(50, "ema50"), (200, "ema200")]:
-                ema = df["close"].ewm(span=span, adjust=False).mean().iloc[-1]
+                if ema_levels is not None:
+                    ema = ema_levels[span]
+                else:
+                    ema = df["close"].ewm(span=span, adjust=False).mean().iloc[-1]
                 clusters.append({
                     "price": ema,
                     "type": label,
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlsplit
+
+from config.constants import (
+    BINANCE_API_URL, BINANCE_FAPI_URL, BINANCE_WEIGHT_LIMITS, BINANCE_WEIGHT_SAFETY, BINANCE_MAX_IN_FLIGHT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _futures_klines_weight(params):
+    limit = int((params or {}).get("limit", 500))
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+# Вес запроса по пути эндпоинта; callable — если вес зависит от параметров
+ENDPOINT_WEIGHTS = {
+    "/api/v3/klines": 2,
+    "/api/v3/ticker/24hr": lambda params: 2 if params and "symbol" in params else 80,
+    "/fapi/v1/klines": _futures_klines_weight,
+    "/fapi/v1/openInterest": 1,
+    "/fapi/v1/fundingRate": 1,
+    "/futures/data/globalLongShortAccountRatio": 1,
+}
+DEFAULT_WEIGHT = 1
+DEFAULT_WEIGHT_LIMIT = 1200
+
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+BURST_SHARE = 0.25      # доля минутного бюджета, доступная сразу в начале минуты
+MAX_BLOCK_WAIT = 120    # дольше не ждём снятия блокировки (418 бан) — запрос отклоняется
+MAX_BACKOFF = 300
+
+
+class RateLimitError(Exception):
+    """Биржа заблокировала IP надолго (418) — ждать в рамках прогона бессмысленно."""
+
+
+class WeightBudget:
+    """Минутный бюджет веса одного API (spot или futures).
+
+    Вес расходуется равномерно: в начале минуты доступна BURST_SHARE
+    бюджета, остальное открывается линейно к концу минуты. Фактический
+    расход берётся из заголовка X-MBX-USED-WEIGHT-1M (в нём учтены и
+    чужие процессы на этом IP). На 429/418 бюджет сужается вдвое и
+    запросы ждут Retry-After; каждая спокойная минута возвращает четверть.
+    """
+
+    def __init__(self, name, limit, safety=BINANCE_WEIGHT_SAFETY, max_in_flight=BINANCE_MAX_IN_FLIGHT):
+        self.name = name
+        self.limit = limit
+        self.base_capacity = max(1, int(limit * safety))
+        self.capacity = self.base_capacity
+        self.max_in_flight = max_in_flight
+
+        self._window = None
+        self._used = 0
+        self._throttled_in_window = False
+        self._blocked_until = 0.0
+        self._strikes = 0
+
+        self._loop = None
+        self._lock = None
+        self._slots = None
+
+        self._requests = 0
+        self._weight_total = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._throttled = 0
+        self._banned = 0
+        self._peak_used = 0
+
+    def _bind_loop(self):
+        # Примитивы asyncio привязаны к циклу: при новом asyncio.run создаём заново
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+
+    def _roll(self, now):
+        window = int(now // 60)
+        if window == self._window:
+            return
+        if self._window is not None and not self._throttled_in_window and self.capacity < self.base_capacity:
+            self.capacity = min(self.base_capacity, self.capacity + self.base_capacity // 4)
+        self._window = window
+        self._used = 0
+        self._throttled_in_window = False
+
+    def _delay_for(self, weight, now):
+        """Сколько ждать, пока weight уложится в бюджет; 0 — можно сразу."""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._roll(now)
+        needed = self._used + weight
+        if needed > self.capacity:
+            return 60 - now % 60 + 0.05
+        share = (needed / self.capacity - BURST_SHARE) / (1 - BURST_SHARE)
+        return max(0.0, share * 60 - now % 60)
+
+    async def acquire(self, weight):
+        self._bind_loop()
+        start = time.monotonic()
+        await self._slots.acquire()
+        try:
+            async with self._lock:
+                while True:
+                    now = time.time()
+                    if self._blocked_until - now > MAX_BLOCK_WAIT:
+                        raise RateLimitError(
+                            f"{self.name}: IP заблокирован ещё на {self._blocked_until - now:.0f} сек"
+                        )
+                    delay = self._delay_for(weight, now)
+                    if delay <= 0:
+                        break
+                    await asyncio.sleep(delay)
+                self._used += weight
+                self._peak_used = max(self._peak_used, self._used)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        waited = time.monotonic() - start
+        self._requests += 1
+        self._weight_total += weight
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def release(self):
+        self._slots.release()
+
+    def observe(self, status, headers):
+        """Сверяет бюджет с ответом биржи: used weight и 429/418."""
+        now = time.time()
+        self._roll(now)
+        used = headers.get(USED_WEIGHT_HEADER)
+        if used is not None and used.isdigit():
+            self._used = max(self._used, int(used))
+            self._peak_used = max(self._peak_used, self._used)
+
+        if status in (418, 429):
+            self._strikes += 1
+            self._throttled_in_window = True
+            if status == 418:
+                self._banned += 1
+            else:
+                self._throttled += 1
+            retry_after = headers.get("Retry-After")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else min(2 ** self._strikes, MAX_BACKOFF)
+            # Параллельные запросы получают 429 пачкой — сужаем бюджет один раз на эпизод
+            if now >= self._blocked_until:
+                self.capacity = max(self.base_capacity // 10, self.capacity // 2)
+            self._blocked_until = max(self._blocked_until, now + delay)
+            logger.warning(
+                f"⚠️ {self.name}: ответ {status}, пауза {delay:.0f} сек, бюджет сужен до {self.capacity}/мин"
+            )
+        elif status == 200:
+            self._strikes = 0
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "capacity": self.capacity,
+            "requests": self._requests,
+            "weight_total": self._weight_total,
+            "peak_used": self._peak_used,
+            "wait_total_sec": round(self._wait_total, 3),
+            "wait_max_sec": round(self._wait_max, 3),
+            "throttled": self._throttled,
+            "banned": self._banned,
+        }
+
+
+class BinanceScheduler:
+    """Общий планировщик REST-запросов к Binance с учётом веса.
+
+    Все вызовы идут через request_json: вес берётся из ENDPOINT_WEIGHTS,
+    бюджет — по хосту (spot и futures лимитируются раздельно).
+    """
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "_initialized"):
+            return
+        self._initialized = True
+
+        self.budgets = {}
+        for name, base_url in (("api", BINANCE_API_URL), ("fapi", BINANCE_FAPI_URL)):
+            host = urlsplit(base_url).netloc
+            # Локальный стенд может обслуживать оба API на одном адресе — бюджет общий
+            if host not in self.budgets:
+                self.budgets[host] = WeightBudget(name, BINANCE_WEIGHT_LIMITS[name])
+
+    def budget_for(self, url) -> WeightBudget:
+        host = urlsplit(url).netloc
+        if host not in self.budgets:
+            self.budgets[host] = WeightBudget(host, DEFAULT_WEIGHT_LIMIT)
+        return self.budgets[host]
+
+    @staticmethod
+    def weight_of(url, params=None) -> int:
+        weight = ENDPOINT_WEIGHTS.get(urlsplit(url).path, DEFAULT_WEIGHT)
+        return weight(params) if callable(weight) else weight
+
+    async def request_json(self, session, url, params=None, timeout=10, retries=3):
+        """GET с учётом веса. Возвращает (status, json | None).
+
+        На 429/418 запрос повторяется после паузы (до retries раз);
+        сетевые ошибки пробрасываются вызывающему коду.
+        """
+        budget = self.budget_for(url)
+        weight = self.weight_of(url, params)
+        status = None
+        for attempt in range(retries + 1):
+            await budget.acquire(weight)
+            try:
+                async with session.get(url, params=params, timeout=timeout) as resp:
+                    status = resp.status
+                    budget.observe(status, resp.headers)
+                    if status == 200:
+                        return status, await resp.json()
+                    if status not in (418, 429):
+                        return status, None
+            finally:
+                budget.release()
+        return status, None
+
+    def stats(self) -> dict:
+        return {budget.name: budget.stats() for budget in self.budgets.values()}
+
+    def log_stats(self):
+        for name, stats in self.stats().items():
+            if not stats["requests"]:
+                continue
+            logger.info(
+                f"📊 Binance {name}: запросов {stats['requests']}, вес {stats['weight_total']} "
+                f"(пик {stats['peak_used']}/{stats['capacity']} в минуту), "
+                f"ожидание всего {stats['wait_total_sec']} сек (макс {stats['wait_max_sec']} сек), "
+                f"429: {stats['throttled']}, 418: {stats['banned']}"
+            )
@@ -0,0 +1,65 @@
+import numpy as np
+
+from config.constants import TIMEFRAME_MS
+
+
+def can_resample(source_tf: str, target_tf: str) -> bool:
+    """target_tf собирается из source_tf: он крупнее и кратен ему."""
+    source, target = TIMEFRAME_MS.get(source_tf), TIMEFRAME_MS.get(target_tf)
+    return bool(source and target) and target > source and target % source == 0
+
+
+def resample_candles(candles: list[dict], source_tf: str, target_tf: str) -> list[dict]:
+    """Собирает свечи target_tf из упорядоченных по времени свечей source_tf.
+
+    Границы корзин совпадают с Binance: open_time кратно длительности
+    таймфрейма от эпохи UTC (1h, 4h, 1d). Корзина выдаётся, только если
+    в ней нет пропусков от её начала: полная — как закрытая свеча,
+    последняя неполная — как текущая незакрытая. Корзины, начало которых
+    не попало в исходные свечи, пропускаются, чтобы не затереть полную
+    свечу частичной.
+    """
+    if not candles:
+        return []
+    if not can_resample(source_tf, target_tf):
+        raise ValueError(f"{target_tf} не собирается из {source_tf}")
+
+    source_ms = TIMEFRAME_MS[source_tf]
+    target_ms = TIMEFRAME_MS[target_tf]
+
+    times = np.fromiter((c["time"] for c in candles), dtype=np.int64, count=len(candles))
+    ohlcv = np.array(
+        [(c["open"], c["high"], c["low"], c["close"], c["volume"]) for c in candles], dtype=np.float64
+    )
+
+    buckets = times - times % target_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    counts = ends - starts + 1
+
+    # Без пропусков: первая свеча — начало корзины, дальше подряд
+    contiguous = (times[starts] == buckets[starts]) & (times[ends] - times[starts] == (counts - 1) * source_ms)
+    complete = counts == target_ms // source_ms
+    is_last = np.zeros(len(starts), dtype=bool)
+    is_last[-1] = True
+    keep = contiguous & (complete | is_last)
+
+    opens = ohlcv[starts, 0]
+    highs = np.maximum.reduceat(ohlcv[:, 1], starts)
+    lows = np.minimum.reduceat(ohlcv[:, 2], starts)
+    closes = ohlcv[ends, 3]
+    volumes = np.add.reduceat(ohlcv[:, 4], starts)
+
+    return [
+        {
+            "time": int(buckets[s]),
+            "open": float(o),
+            "high": float(h),
+            "low": float(l),
+            "close": float(c),
+            "volume": float(v),
+        }
+        for s, o, h, l, c, v in zip(
+            starts[keep], opens[keep], highs[keep], lows[keep], closes[keep], volumes[keep]
+        )
+    ]
@@ -1,74 +1,59 @@
-import aiohttp
 import asyncio
 import logging
 
+from config.constants import BINANCE_FAPI_URL as BINANCE_FAPI
 from database.database import DatabaseManager
+from services.http_client import HttpClient
 
-BINANCE_FAPI = "https://fapi.binance.com"
 logger = logging.getLogger(__name__)
 
 
 class SentimentEngine:
     def __init__(self):
         self.db = DatabaseManager()
+        self.http = HttpClient()
 
     async def _fetch_json(self, url, params=None, timeout=7):
         try:
-            async with aiohttp.ClientSession() as sess:
-                async with sess.get(url, params=params, timeout=timeout) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
-                    else:
-                        logger.warning(f"⚠️ Ошибка ответа {resp.status} от {url} для {params}")
+            status, data = await self.http.binance_json(url, params=params, timeout=timeout)
+            if status == 200:
+                return data
+            logger.warning(f"⚠️ Ошибка ответа {status} от {url} для {params}")
         except Exception as e:
             logger.error(f"❌ Ошибка подключения к {url} для {params}: {e}")
         return None
 
     def _save(self, rows):
+        self.db.save_indicator_values(
+            ((r["symbol"], r["timeframe"], r["indicator_type"], r["value"]) for r in rows),
+            source="sentiment",
+        )
+
+    async def _usdt_symbols(self, quote="USDT"):
         conn = self.db.get_connection()
         try:
-            sql = """
-            INSERT INTO indicators (symbol, timeframe, indicator_type, value, created_at)
-            VALUES (%s, %s, %s, %s, NOW())
-            ON CONFLICT (symbol, timeframe, indicator_type)
-            DO UPDATE SET value = EXCLUDED.value, created_at = EXCLUDED.created_at
-            """
             with conn.cursor() as cur:
-                for r in rows:
-                    cur.execute(sql, (
-                        r["symbol"],
-                        r["timeframe"],
-                        r["indicator_type"],
-                        str(r["value"])
-                    ))
-            conn.commit()
-        except Exception as e:
-            logger.error(f"❌ Ошибка сохранения сентимента: {e}")
-            conn.rollback()
+                cur.execute("SELECT symbol FROM pairs_cache WHERE symbol ILIKE %s", (f"%{quote}",))
+                return [row[0] for row in cur.fetchall()]
         finally:
             self.db.release_connection(conn)
 
-    async def _usdt_symbols(self, quote="USDT"):
-        conn = self.db.get_connection()
-        with conn, conn.cursor() as cur:
-            cur.execute("SELECT symbol FROM pairs_cache WHERE symbol ILIKE %s", (f"%{quote}",))
-            return [row[0] for row in cur.fetchall()]
-
-    async def update_for_all(self, quote="USDT", interval="5m", max_concurrent=10):
+    async def update_for_all(self, quote="USDT", interval="5m"):
         symbols = await self._usdt_symbols(quote)
         if not symbols:
             logger.warning("SentimentEngine: не найдено ни одной пары с USDT")
             return
 
-        sem = asyncio.Semaphore(max_concurrent)
-
-        async def _guarded(sym):
-            async with sem:
-                await self.update(symbol=sym, interval=interval)
-
-        await asyncio.gather(*[_guarded(s) for s in symbols])
+        # Темп запросов задаёт общий BinanceScheduler
+        results = await asyncio.gather(*[self._collect(symbol=s, interval=interval) for s in symbols])
+        self._save([r for rows in results for r in rows])
 
     async def update(self, symbol="BTCUSDT", interval="5m"):
+        rows = await self._collect(symbol=symbol, interval=interval)
+        if rows:
+            self._save(rows)
+
+    async def _collect(self, symbol="BTCUSDT", interval="5m") -> list[dict]:
         symbol = symbol.replace("/", "").upper()
         url = f"{BINANCE_FAPI}/futures/data/globalLongShortAccountRatio"
         data = await self._fetch_json(url, {
@@ -78,15 +63,14 @@ class SentimentEngine:
         })
 
         if not data:
-            return
+            return []
 
         rec = data[0]
         longs = float(rec["longAccount"])
         shorts = float(rec["shortAccount"])
         ratio = 100 * longs / (longs + shorts)
 
-        rows = [
+        return [
             {"symbol": symbol, "timeframe": interval, "indicator_type": "LONGS_RATIO", "value": ratio},
             {"symbol": symbol, "timeframe": interval, "indicator_type": "SHORTS_RATIO", "value": 100 - ratio},
         ]
-        self._save(rows)
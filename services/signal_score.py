@@ -22,6 +22,19 @@ class SignalScorer:
             except (TypeError, ValueError):
                 return None
 
+        def trend_side(x):
+            """Направление SuperTrend: "long" / "short" / None.
+
+            В indicator_values SUPERTREND хранится числом (1.0 — восходящий,
+            0.0 — нисходящий); строки "True"/"False" — прежний формат меток.
+            """
+            if isinstance(x, str):
+                x = {"true": 1.0, "false": 0.0}.get(x.strip().lower(), to_float(x))
+            x = to_float(x)
+            if x is None or x != x:
+                return None
+            return "long" if x > 0 else "short"
+
         rsi = to_float(indicators.get("rsi"))
         macd_h = to_float(indicators.get("macd_hist"))
         ema50 = to_float(indicators.get("ema50"))
@@ -43,7 +56,7 @@ class SignalScorer:
         oi = indicators.get("oi")
         fund_rate = indicators.get("fund_rate")
         vwap = indicators.get("vwap")
-        poc = indicators.get("vpvr_poc")
+        poc = indicators.get("poc")
         sentiment = indicators.get("longs_ratio")  # или другой ключ
 
         # ── безопасно получаем цену ───────────────────────────────────────────
@@ -154,7 +167,7 @@ class SignalScorer:
             if adx is not None and adx > 25:
                 score += 5
                 details.append(f"✅ ADX {adx:.1f} (сильный тренд)")
-            if st is not None and ((st and signal_type == "long") or (not st and signal_type == "short")):
+            if trend_side(st) == signal_type:
                 score += 6
                 details.append("✅ SuperTrend в ту же сторону")
 
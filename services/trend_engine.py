@@ -1,6 +1,7 @@
-import pandas as pd
 from datetime import datetime
+import numpy as np
 from database.database import DatabaseManager
+from services import batch_indicators
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,16 +13,29 @@ class TrendAnalyzer:
 
     def analyze_trends(self):
         candles = self.db.get_all_candles()
+        emas = {}
+        for tf, group in batch_indicators.group_by_timeframe(candles).items():
+            keys, arrays = batch_indicators.pack_candles(group)
+            emas.update(self.compute_batch(tf, keys, batch_indicators.IndicatorContext(arrays)))
+
+        self.db.save_trends(self.build_trends(candles, emas))
+
+    def compute_batch(self, tf, keys, context):
+        """EMA50/EMA200 на последней свече по рядам таймфрейма: {(symbol, tf): (ema50, ema200)}."""
+        rows = np.flatnonzero(context.lengths >= 200)
+        if not len(rows):
+            return {}
+        ema50, ema200 = context.last("ema50"), context.last("ema200")
+        return {keys[row]: (ema50[row], ema200[row]) for row in rows}
+
+    def build_trends(self, series_keys, emas):
+        """Тренд по символу; при нескольких таймфреймах побеждает последний в порядке series_keys."""
         trends = {}
-
-        for (symbol, tf), data in candles.items():
-            if len(data) < 200:
+        for (symbol, tf) in series_keys:
+            if (symbol, tf) not in emas:
                 continue
 
-            df = pd.DataFrame(data)
-            df["close"] = pd.to_numeric(df["close"])
-            ema50 = df["close"].ewm(span=50, adjust=False).mean().iloc[-1]
-            ema200 = df["close"].ewm(span=200, adjust=False).mean().iloc[-1]
+            ema50, ema200 = emas[(symbol, tf)]
             direction = "bullish" if ema50 > ema200 else "bearish"
 
             trends[symbol] = {
@@ -30,5 +44,4 @@ class TrendAnalyzer:
                 "ema200": ema200,
                 "last_updated": datetime.now().timestamp()
             }
-
-        self.db.save_trends(trends)
+        return trends
@@ -29,13 +29,16 @@ class SignalWorker:
         trend_cache = {t["symbol"]: t for t in self.db.get_all_trends()}
         levels_cache = self.db.get_levels()
         market_cap_data = self.db.get_market_cap()
+        snapshot = self.db.get_indicator_snapshot()
+        candles_cache = self.db.get_all_candles()
 
         results = []
 
         with ThreadPoolExecutor(max_workers=20) as executor:
             futures = {
                 executor.submit(
-                    self.analyze_pair, symbol, tf, trend_cache, levels_cache, market_cap_data
+                    self.analyze_pair, symbol, tf, trend_cache, levels_cache, market_cap_data,
+                    snapshot, candles_cache,
                 ): (symbol, tf)
                 for symbol, tf in tasks
             }
@@ -96,24 +99,27 @@ class SignalWorker:
                 all_details.extend(d.split("\n"))
         return list(dict.fromkeys(all_details))  # уникальные, порядок сохранён
 
-    def analyze_pair(self, symbol, timeframe, trend_cache, levels_cache, market_cap_data):
+    def analyze_pair(self, symbol, timeframe, trend_cache, levels_cache, market_cap_data,
+                     snapshot=None, candles_cache=None):
         start = time.time()
-        raw = self.db.get_indicators(symbol, timeframe)
-
-        def _as_float(val):
-            if val in (None, ""): return None
-            try: return float(val)
-            except: return None
+        if snapshot is not None:
+            raw = snapshot.get((symbol, timeframe), {})
+        else:
+            raw = self.db.get_indicators(symbol, timeframe)
 
-        indicators = {k.lower(): _as_float(v) for k, v in raw.items()}
-        candles = self.db.get_candles(symbol, timeframe)
+        indicators = {k.lower(): v for k, v in raw.items()}
+        indicators["poc"] = indicators.pop("vpvr_poc", None)
+        if candles_cache is not None:
+            candles = candles_cache.get((symbol, timeframe), [])
+        else:
+            candles = self.db.get_candles(symbol, timeframe)
         if not candles or len(candles) < 30:
             return None
 
         current_price = candles[-1]["close"]
         trend_data = trend_cache.get(symbol, {})
         levels = [lvl for lvl in levels_cache if lvl["symbol"] == symbol and lvl["timeframe"] == timeframe]
-        fibo = self.fibo.calculate_for_pair(symbol, timeframe)
+        fibo = self.fibo.calculate_for_pair(symbol, timeframe, candles)
 
         base_payload = {
             "symbol": symbol,
@@ -130,7 +136,7 @@ class SignalWorker:
             "fund_rate": indicators.get("fund_rate"),
             "supertrend": indicators.get("supertrend"),
             "vwap": indicators.get("vwap"),
-            "poc": indicators.get("vpvr_poc"),
+            "poc": indicators.get("poc"),
         }
 
         results = []
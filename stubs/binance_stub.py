@@ -0,0 +1,232 @@
+# stubs/binance_stub.py
+"""Локальный стенд Binance REST для прогона сборщиков без биржи.
+
+Отдаёт детерминированные синтетические данные по тем же путям, что и
+Binance, считает вес запросов по минутам, возвращает X-MBX-USED-WEIGHT-1M
+и 429 + Retry-After при превышении лимита (418 — после --ban-after
+нарушений подряд). /stream отдаёт combined kline-потоки: незакрытую
+свечу каждые --ws-tick сек и закрытую при смене интервала.
+
+Запуск:
+    python -m stubs.binance_stub --port 8089 --weight-limit 600
+    BINANCE_API_URL=http://127.0.0.1:8089 BINANCE_FAPI_URL=http://127.0.0.1:8089 \\
+        python run_full.py --mode update
+    BINANCE_WS_URL=ws://127.0.0.1:8089 BINANCE_API_URL=http://127.0.0.1:8089 python run_realtime.py --mode stream
+"""
+import argparse
+import asyncio
+import logging
+import math
+import random
+import time
+import zlib
+
+from aiohttp import web
+
+from config.constants import TIMEFRAME_MS
+from services.rate_limiter import BinanceScheduler, USED_WEIGHT_HEADER
+
+logger = logging.getLogger("binance_stub")
+
+DEFAULT_SYMBOLS = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "SOLUSDT", "XRPUSDT", "ADAUSDT", "DOGEUSDT", "USDCUSDT"]
+
+
+def _base_price(symbol):
+    return 1 + zlib.crc32(symbol.encode()) % 50_000
+
+
+def _synthetic_bar(symbol, interval, open_time):
+    """Детерминированная OHLCV-свеча: одинаковые (symbol, open_time) — одинаковые цены."""
+    base = _base_price(symbol)
+    step = open_time // TIMEFRAME_MS[interval]
+    rnd = random.Random(zlib.crc32(f"{symbol}{interval}{open_time}".encode()))
+    open_ = base * (1 + 0.1 * math.sin(step / 50))
+    close = open_ * (1 + rnd.uniform(-0.01, 0.01))
+    high = max(open_, close) * (1 + rnd.uniform(0, 0.005))
+    low = min(open_, close) * (1 - rnd.uniform(0, 0.005))
+    volume = rnd.uniform(10, 1000)
+    return [
+        open_time, f"{open_:.8f}", f"{high:.8f}", f"{low:.8f}", f"{close:.8f}", f"{volume:.8f}",
+        open_time + TIMEFRAME_MS[interval] - 1, f"{volume * close:.8f}", rnd.randint(10, 500),
+        f"{volume / 2:.8f}", f"{volume * close / 2:.8f}", "0",
+    ]
+
+
+class BinanceStub:
+    def __init__(self, symbols, weight_limit, ban_after, latency_ms,
+                 ws_tick=1.0, ws_close_every=0, ws_drop_after=0):
+        self.symbols = symbols
+        self.ws_tick = ws_tick
+        self.ws_close_every = ws_close_every
+        self.ws_drop_after = ws_drop_after
+        self.weight_limit = weight_limit
+        self.ban_after = ban_after
+        self.latency = latency_ms / 1000
+        self.window = None
+        self.used = 0
+        self.violations = 0
+        self.banned_until = 0.0
+        self.served = 0
+        self.rejected = 0
+
+    @web.middleware
+    async def weight_middleware(self, request, handler):
+        if request.path == "/stream":
+            # WebSocket-потоки лимитируются отдельно от веса REST
+            return await handler(request)
+        now = time.time()
+        if now < self.banned_until:
+            self.rejected += 1
+            return web.json_response(
+                {"code": -1003, "msg": "IP banned."}, status=418,
+                headers={"Retry-After": str(math.ceil(self.banned_until - now))},
+            )
+
+        window = int(now // 60)
+        if window != self.window:
+            self.window, self.used = window, 0
+
+        self.used += BinanceScheduler.weight_of(request.path, dict(request.query))
+        headers = {USED_WEIGHT_HEADER: str(self.used)}
+        if self.used > self.weight_limit:
+            self.violations += 1
+            self.rejected += 1
+            retry_after = math.ceil(60 - now % 60)
+            if self.ban_after and self.violations >= self.ban_after:
+                retry_after = max(retry_after, 120)
+                self.banned_until = now + retry_after
+                return web.json_response({"code": -1003, "msg": "IP banned."}, status=418,
+                                         headers={**headers, "Retry-After": str(retry_after)})
+            headers["Retry-After"] = str(retry_after)
+            return web.json_response({"code": -1003, "msg": "Too many requests."}, status=429, headers=headers)
+
+        self.violations = 0
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.served += 1
+        response = await handler(request)
+        response.headers.update(headers)
+        return response
+
+    async def klines(self, request):
+        q = request.query
+        symbol, interval = q.get("symbol"), q.get("interval")
+        if interval not in TIMEFRAME_MS:
+            return web.json_response({"code": -1120, "msg": "Invalid interval."}, status=400)
+        step = TIMEFRAME_MS[interval]
+        limit = min(int(q.get("limit", 500)), 1000)
+        now = int(time.time() * 1000)
+        last = now - now % step
+        if "endTime" in q:
+            last = min(last, int(q["endTime"]) - int(q["endTime"]) % step)
+        if "startTime" in q:
+            first = int(q["startTime"]) + (-int(q["startTime"])) % step
+            times = range(first, min(last, first + (limit - 1) * step) + 1, step)
+        else:
+            times = range(last - (limit - 1) * step, last + 1, step)
+        return web.json_response([_synthetic_bar(symbol, interval, t) for t in times])
+
+    async def ticker_24hr(self, request):
+        symbols = [request.query["symbol"]] if "symbol" in request.query else self.symbols
+        return web.json_response([
+            {"symbol": s, "lastPrice": f"{_base_price(s):.8f}", "quoteVolume": "1000000.0"} for s in symbols
+        ])
+
+    async def open_interest(self, request):
+        symbol = request.query.get("symbol")
+        return web.json_response({"symbol": symbol, "openInterest": f"{_base_price(symbol) * 3:.3f}",
+                                  "time": int(time.time() * 1000)})
+
+    async def funding_rate(self, request):
+        symbol = request.query.get("symbol")
+        rate = (zlib.crc32(symbol.encode()) % 200 - 100) / 1_000_000
+        return web.json_response([{"symbol": symbol, "fundingRate": f"{rate:.8f}",
+                                   "fundingTime": int(time.time() * 1000)}])
+
+    async def long_short_ratio(self, request):
+        symbol = request.query.get("symbol")
+        longs = 0.4 + (zlib.crc32(symbol.encode()) % 200) / 1000
+        return web.json_response([{"symbol": symbol, "longAccount": f"{longs:.4f}",
+                                   "shortAccount": f"{1 - longs:.4f}", "longShortRatio": f"{longs / (1 - longs):.4f}",
+                                   "timestamp": int(time.time() * 1000)}])
+
+    async def stream(self, request):
+        """Combined kline-потоки: /stream?streams=btcusdt@kline_1h/ethusdt@kline_15m"""
+        streams = [name for name in request.query.get("streams", "").split("/") if "@kline_" in name]
+        ws = web.WebSocketResponse(autoping=True)
+        await ws.prepare(request)
+        started = time.monotonic()
+        last_open = {}
+        ticks = 0
+        try:
+            while not ws.closed:
+                ticks += 1
+                now = int(time.time() * 1000)
+                for name in streams:
+                    symbol, interval = name.split("@kline_")
+                    if interval not in TIMEFRAME_MS:
+                        continue
+                    step = TIMEFRAME_MS[interval]
+                    current = now - now % step
+                    previous = last_open.get(name)
+                    # --ws-close-every: тестовое «закрытие» текущей свечи без ожидания конца интервала
+                    forced = self.ws_close_every and ticks % self.ws_close_every == 0
+                    if previous is not None and previous != current:
+                        await ws.send_json(self._kline_event(name, symbol.upper(), interval, previous, closed=True))
+                    await ws.send_json(self._kline_event(name, symbol.upper(), interval, current, closed=bool(forced)))
+                    last_open[name] = current
+                if self.ws_drop_after and time.monotonic() - started >= self.ws_drop_after:
+                    await ws.close()
+                    break
+                await asyncio.sleep(self.ws_tick)
+        except ConnectionResetError:
+            pass
+        return ws
+
+    @staticmethod
+    def _kline_event(name, symbol, interval, open_time, closed):
+        bar = _synthetic_bar(symbol, interval, open_time)
+        return {
+            "stream": name,
+            "data": {
+                "e": "kline", "E": int(time.time() * 1000), "s": symbol,
+                "k": {
+                    "t": open_time, "T": bar[6], "s": symbol, "i": interval,
+                    "o": bar[1], "h": bar[2], "l": bar[3], "c": bar[4], "v": bar[5],
+                    "n": bar[8], "x": closed, "q": bar[7],
+                },
+            },
+        }
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.weight_middleware])
+        app.router.add_get("/api/v3/klines", self.klines)
+        app.router.add_get("/api/v3/ticker/24hr", self.ticker_24hr)
+        app.router.add_get("/fapi/v1/openInterest", self.open_interest)
+        app.router.add_get("/fapi/v1/fundingRate", self.funding_rate)
+        app.router.add_get("/futures/data/globalLongShortAccountRatio", self.long_short_ratio)
+        app.router.add_get("/stream", self.stream)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд Binance REST")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--weight-limit", type=int, default=6000, help="вес в минуту до ответа 429")
+    parser.add_argument("--ban-after", type=int, default=0, help="429 подряд до бана 418 (0 — без бана)")
+    parser.add_argument("--latency-ms", type=int, default=0, help="искусственная задержка ответа")
+    parser.add_argument("--symbols", nargs="*", default=DEFAULT_SYMBOLS)
+    parser.add_argument("--ws-tick", type=float, default=1.0, help="период kline-событий в /stream, сек")
+    parser.add_argument("--ws-close-every", type=int, default=0, help="помечать свечу закрытой каждые N тиков")
+    parser.add_argument("--ws-drop-after", type=float, default=0, help="рвать WS-соединение через N сек")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    stub = BinanceStub(args.symbols, args.weight_limit, args.ban_after, args.latency_ms,
+                       args.ws_tick, args.ws_close_every, args.ws_drop_after)
+    web.run_app(stub.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()